@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-17 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_alter_account_app_secret_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='priority',
+            field=models.CharField(choices=[('high', 'High'), ('normal', 'Normal'), ('low', 'Low')], default='normal', max_length=10),
+        ),
+    ]
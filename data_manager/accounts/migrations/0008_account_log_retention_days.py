@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-17 19:57
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_account_priority'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='log_retention_days',
+            field=models.PositiveIntegerField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(3650)]),
+        ),
+    ]
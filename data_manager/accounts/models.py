@@ -1,12 +1,22 @@
 # accounts/models.py
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
+from django.core.validators import MinValueValidator, MaxValueValidator
 from users.models import CustomUser, Role
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 import uuid
 
 class Account(models.Model):
+    PRIORITIES = (
+        ('high', 'High'),
+        ('normal', 'Normal'),
+        ('low', 'Low'),
+    )
     name = models.CharField(max_length=255, unique=True, db_index=True)
     app_secret_token = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    priority = models.CharField(max_length=10, choices=PRIORITIES, default='normal')  # Delivery queue tier
+    log_retention_days = models.PositiveIntegerField(null=True, blank=True, validators=[MinValueValidator(1), MaxValueValidator(3650)])  # None: LOG_RETENTION_DAYS_DEFAULT
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, related_name='created_accounts')
@@ -29,4 +39,21 @@ class AccountMember(models.Model):
         indexes = [models.Index(fields=['account', 'user'])]
 
     def __str__(self):
-        return f"{self.user.email} - {self.account.name} ({self.role.role_name})"
\ No newline at end of file
+        return f"{self.user.email} - {self.account.name} ({self.role.role_name})"
+
+@receiver(post_save, sender=Account)
+def invalidate_account_token_cache(sender, instance, **kwargs):
+    from .token_cache import invalidate_account_token
+    user_ids = list(instance.members.values_list('user_id', flat=True))
+    app_secret_token = str(instance.app_secret_token)
+    # After commit, so a concurrent lookup cannot re-cache the state being replaced
+    transaction.on_commit(lambda: invalidate_account_token(user_ids, app_secret_token))
+
+@receiver(post_save, sender=AccountMember)
+@receiver(post_delete, sender=AccountMember)
+def invalidate_member_token_cache(sender, instance, **kwargs):
+    from .token_cache import invalidate_account_token
+    app_secret_token = Account.objects.filter(id=instance.account_id).values_list('app_secret_token', flat=True).first()
+    if app_secret_token:
+        user_id = instance.user_id
+        transaction.on_commit(lambda: invalidate_account_token([user_id], str(app_secret_token)))
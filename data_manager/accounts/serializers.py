@@ -6,10 +6,11 @@ from users.models import CustomUser, Role
 class AccountSerializer(serializers.ModelSerializer):
     class Meta:
         model = Account
-        fields = ['id', 'name', 'app_secret_token', 'created_at', 'updated_at']  # Added app_secret_token
+        fields = ['id', 'name', 'app_secret_token', 'priority', 'log_retention_days', 'created_at', 'updated_at']  # Added app_secret_token
         extra_kwargs = {
             'id': {'read_only': True},
             'app_secret_token': {'read_only': True},  # Prevent manual edits
+            'priority': {'read_only': True},  # Set by operators
             'created_at': {'read_only': True},
             'updated_at': {'read_only': True}
         }
@@ -17,12 +18,16 @@ class AccountSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         request = self.context['request']
         user = request.user
-        account = Account.objects.create(name=validated_data['name'], created_by=user, updated_by=user)
+        account = Account.objects.create(
+            name=validated_data['name'], log_retention_days=validated_data.get('log_retention_days'),
+            created_by=user, updated_by=user
+        )
         AccountMember.objects.create(account=account, user=user, role=Role.objects.get(role_name='Admin'), created_by=user, updated_by=user)
         return account
 
     def update(self, instance, validated_data):
         instance.name = validated_data.get('name', instance.name)
+        instance.log_retention_days = validated_data.get('log_retention_days', instance.log_retention_days)
         instance.updated_by = self.context['request'].user
         instance.save()
         return instance
@@ -1,3 +1,42 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from users.models import CustomUser, Role
+from .models import Account, AccountMember
+from .token_cache import resolve_account_id, _local_cache
 
-# Create your tests here.
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class AccountTokenCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        _local_cache.clear()
+        self.user = CustomUser.objects.create_user(email='member@example.com', password='x')
+        self.account = Account.objects.create(name='tokens')
+        self.role = Role.objects.create(role_name='Admin')
+
+    def test_membership_change_invalidates_after_commit(self):
+        token = str(self.account.app_secret_token)
+        self.assertIsNone(resolve_account_id(self.user.id, token))
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            AccountMember.objects.create(account=self.account, user=self.user, role=self.role)
+            # Until the membership commits, lookups keep the cached miss rather than re-caching early
+            self.assertIsNone(resolve_account_id(self.user.id, token))
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(resolve_account_id(self.user.id, token), self.account.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            AccountMember.objects.filter(account=self.account, user=self.user).delete()
+        self.assertIsNone(resolve_account_id(self.user.id, token))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class AccountCreateTests(TestCase):
+    def test_retention_is_kept_on_create(self):
+        user = CustomUser.objects.create_user(email='admin@example.com', password='x')
+        AccountMember.objects.create(account=Account.objects.create(name='existing'), user=user, role=Role.objects.create(role_name='Admin'))
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post('/accounts/', {'name': 'kept', 'log_retention_days': 7}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['log_retention_days'], 7)
+        self.assertEqual(Account.objects.get(name='kept').log_retention_days, 7)
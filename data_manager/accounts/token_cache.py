@@ -0,0 +1,73 @@
+# accounts/token_cache.py
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from data_manager.lru import LocalLRUCache
+from .models import Account
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+_local_cache = LocalLRUCache(
+    maxsize=settings.ACCOUNT_TOKEN_CACHE_LOCAL_SIZE,
+    timeout=settings.ACCOUNT_TOKEN_CACHE_LOCAL_TIMEOUT
+)
+
+def _cache_key(user_id, app_secret_token):
+    return f"account_token_{user_id}_{app_secret_token}"
+
+def resolve_account_id(user_id, app_secret_token):
+    """
+    Returns the id of the account owning app_secret_token that user_id is a member of, or None.
+    Looks in the in-process LRU, then Redis, then the database. Misses are cached
+    too (for ACCOUNT_TOKEN_CACHE_NEGATIVE_TIMEOUT) so floods of bad tokens stay off the DB.
+    app_secret_token must already be in canonical UUID string form.
+    """
+    key = _cache_key(user_id, app_secret_token)
+    account_id = _local_cache.get(key, _MISSING)
+    if account_id is not _MISSING:
+        return account_id
+
+    account_id = cache.get(key, _MISSING)
+    if account_id is _MISSING:
+        account_id = Account.objects.filter(
+            members__user_id=user_id, app_secret_token=app_secret_token
+        ).values_list('id', flat=True).first()
+        timeout = settings.ACCOUNT_TOKEN_CACHE_TIMEOUT if account_id else settings.ACCOUNT_TOKEN_CACHE_NEGATIVE_TIMEOUT
+        cache.set(key, account_id, timeout=timeout)
+
+    local_timeout = settings.ACCOUNT_TOKEN_CACHE_LOCAL_TIMEOUT
+    if not account_id:
+        local_timeout = min(local_timeout, settings.ACCOUNT_TOKEN_CACHE_NEGATIVE_TIMEOUT)
+    _local_cache.set(key, account_id, timeout=local_timeout)
+    return account_id
+
+async def aresolve_account_id(user_id, app_secret_token):
+    """
+    Async counterpart of resolve_account_id for ASGI views.
+    """
+    key = _cache_key(user_id, app_secret_token)
+    account_id = _local_cache.get(key, _MISSING)
+    if account_id is not _MISSING:
+        return account_id
+
+    account_id = await cache.aget(key, _MISSING)
+    if account_id is _MISSING:
+        account_id = await Account.objects.filter(
+            members__user_id=user_id, app_secret_token=app_secret_token
+        ).values_list('id', flat=True).afirst()
+        timeout = settings.ACCOUNT_TOKEN_CACHE_TIMEOUT if account_id else settings.ACCOUNT_TOKEN_CACHE_NEGATIVE_TIMEOUT
+        await cache.aset(key, account_id, timeout=timeout)
+
+    local_timeout = settings.ACCOUNT_TOKEN_CACHE_LOCAL_TIMEOUT
+    if not account_id:
+        local_timeout = min(local_timeout, settings.ACCOUNT_TOKEN_CACHE_NEGATIVE_TIMEOUT)
+    _local_cache.set(key, account_id, timeout=local_timeout)
+    return account_id
+
+def invalidate_account_token(user_ids, app_secret_token):
+    # Other processes drop their local copy within ACCOUNT_TOKEN_CACHE_LOCAL_TIMEOUT
+    keys = [_cache_key(user_id, app_secret_token) for user_id in user_ids]
+    for key in keys:
+        _local_cache.delete(key)
+    cache.delete_many(keys)
@@ -0,0 +1,49 @@
+# data_manager/cache_namespace.py
+"""
+Generation-counted cache namespaces. Every key cached under (namespace, scope) embeds the
+scope's current generation, so a single INCR (bump) orphans all of them at once; orphaned
+entries simply expire. Typical scope: an account id.
+"""
+import time
+from django.core.cache import cache
+
+def _generation_key(namespace, scope):
+    return f"ns_{namespace}_{scope}"
+
+def _seed():
+    # Seed from the clock so a lost counter never revisits keys cached under an older generation
+    return time.time_ns() // 1000000
+
+def get_generation(namespace, scope):
+    key = _generation_key(namespace, scope)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _seed(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+async def aget_generation(namespace, scope):
+    key = _generation_key(namespace, scope)
+    generation = await cache.aget(key)
+    if generation is None:
+        await cache.aadd(key, _seed(), timeout=None)
+        generation = await cache.aget(key)
+    return generation
+
+def namespaced_key(namespace, scope, *parts):
+    return ':'.join([namespace, str(scope), str(get_generation(namespace, scope)), *map(str, parts)])
+
+def bump(namespace, *scopes):
+    for scope in scopes:
+        try:
+            cache.incr(_generation_key(namespace, scope))
+        except ValueError:
+            # No generation yet, so nothing was cached under it; the next reader seeds one
+            pass
+
+async def abump(namespace, *scopes):
+    for scope in scopes:
+        try:
+            await cache.aincr(_generation_key(namespace, scope))
+        except ValueError:
+            pass
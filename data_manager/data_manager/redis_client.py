@@ -0,0 +1,22 @@
+# data_manager/redis_client.py
+import threading
+import redis
+from django.conf import settings
+
+_clients = {}
+_lock = threading.Lock()
+
+def get_redis(url=None):
+    """
+    Returns a process-wide redis client for url (default REDIS_URL).
+    For data structures the Django cache API cannot express (SET NX batches, streams, Lua).
+    redis-py pools are fork-aware, so clients are safe to create before Celery forks.
+    """
+    url = url or settings.REDIS_URL
+    client = _clients.get(url)
+    if client is None:
+        with _lock:
+            client = _clients.get(url)
+            if client is None:
+                client = _clients[url] = redis.Redis.from_url(url)
+    return client
@@ -144,14 +144,106 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.TokenAuthentication',
     ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',  # Add this for Swagger/OpenAPI
+    'DEFAULT_PARSER_CLASSES': [
+        'destinations.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'destinations.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_THROTTLE_CLASSES': [
         'rest_framework.throttling.UserRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'user': '5/second',  # 5 requests per second per user
+        'account': '1000/second',  # ingest events per second per account (token bucket)
     }
 }
 
+# Bucket sizes for the token-bucket throttles; a scope without an entry allows one second of burst
+THROTTLE_BURSTS = {
+    'account': 2000,
+}
+
+# Maximum number of events accepted by /server/incoming_data/batch/ in one request
+DATA_HANDLER_BATCH_MAX_ITEMS = 500
+
+# CL-X-TOKEN -> account resolution cache (seconds); see accounts/token_cache.py
+ACCOUNT_TOKEN_CACHE_TIMEOUT = 300
+ACCOUNT_TOKEN_CACHE_NEGATIVE_TIMEOUT = 10
+ACCOUNT_TOKEN_CACHE_LOCAL_TIMEOUT = 30
+ACCOUNT_TOKEN_CACHE_LOCAL_SIZE = 4096
+
+# Per-account destination routing tables (seconds); see destinations/routing.py
+ROUTING_TABLE_TIMEOUT = 24 * 60 * 60
+ROUTING_TABLE_LOCAL_TIMEOUT = 60
+ROUTING_TABLE_LOCAL_SIZE = 1024
+# Headers sent to every destination unless the destination overrides them
+DESTINATION_DEFAULT_HEADERS = {'Content-Type': 'application/json'}
+
+# How long a CL-X-EVENT-ID is remembered for duplicate rejection (seconds); see destinations/idempotency.py
+EVENT_ID_DEDUP_TIMEOUT = 60 * 60
+# How long a claimed CL-X-EVENT-ID stays reserved before its logs are stored (seconds). Longer than
+# any ingest request may run, so a request killed mid-insert frees the id for the client's retry.
+EVENT_ID_INFLIGHT_TIMEOUT = 60
+
+# Write-behind ingest: when enabled, ingest only appends to a Redis stream and answers 202;
+# `python manage.py flush_ingest_stream` creates the Logs and enqueues delivery.
+INGEST_WRITE_BEHIND = False
+INGEST_STREAM_KEY = 'ingest:events'
+INGEST_STREAM_GROUP = 'ingest-flushers'
+INGEST_STREAM_MAXLEN = 1000000
+INGEST_FLUSH_BATCH_SIZE = 500
+# An entry whose insert has failed on this many deliveries is moved to the dead-letter stream
+INGEST_FLUSH_MAX_DELIVERIES = 5
+INGEST_DEAD_LETTER_KEY = 'ingest:events:dead'
+
+# Largest request body the JSON/NDJSON parsers will read (bytes); larger bodies get a 413
+API_MAX_BODY_SIZE = 10 * 1024 * 1024
+
+# 'celery' publishes send_to_destination_batch tasks of up to DELIVERY_BATCH_SIZE log ids, which claim their
+# logs before delivering; 'engine' leaves logs pending for `manage.py run_delivery_engine`
+DELIVERY_BACKEND = 'celery'
+# Logs delivered (sequentially) by one send_to_destination_batch task
+DELIVERY_BATCH_SIZE = 20
+# Delivery tasks go to 'delivery.<Account.priority>.<shard>' with accounts spread over this many
+# shards per priority; start workers with `manage.py run_delivery_worker --priority <priority>`
+DELIVERY_QUEUE_SHARDS = 4
+# Delivery tasks and flush_destination_batch hold the logs they deliver in 'processing'; claims
+# older than this (seconds) are considered abandoned
+DELIVERY_CLAIM_LEASE = 10 * 60
+
+# Failed deliveries are retried with jittered exponential backoff up to Destination.max_attempts,
+# then dead-lettered (status 'dead'). Delays are in seconds.
+RETRY_BACKOFF_BASE = 2
+RETRY_BACKOFF_MAX = 60 * 60
+RETRY_DISPATCH_BATCH_SIZE = 1000
+
+# Per-destination circuit breaker; see destinations/circuit_breaker.py. Durations in seconds.
+CIRCUIT_FAILURE_THRESHOLD = 5  # consecutive failures that open the circuit
+CIRCUIT_FAILURE_WINDOW = 60  # failures further apart than this start a new count
+CIRCUIT_OPEN_SECONDS = 30  # how long deliveries are parked before probing
+CIRCUIT_PROBE_INTERVAL = 5  # at most one probe per interval while half-open
+
+# Outbound delivery connection pooling (per worker process); see destinations/http_client.py
+DELIVERY_POOL_HOSTS = 100  # destination hosts kept in the pool manager
+DELIVERY_POOL_MAXSIZE = 10  # keep-alive connections kept per host
+DELIVERY_POOL_STATS_INTERVAL = 30  # seconds between each delivering process's pool stats snapshot in Redis
+
+# LogListView keyset pagination: default and maximum ?page_size=
+LOG_PAGE_SIZE = 100
+LOG_PAGE_SIZE_MAX = 1000
+
+# Rows fetched per round trip by the streaming log export (server-side cursor on PostgreSQL)
+LOG_EXPORT_CHUNK_SIZE = 2000
+
+# Logs older than the account's log_retention_days (or this default) are purged in batches by
+# the purge_expired_logs beat task; payloads no log references any more are purged with them
+LOG_RETENTION_DAYS_DEFAULT = 90
+LOG_PURGE_BATCH_SIZE = 1000
+
 # Optional: Customize Swagger settings (add this block if desired)
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Authentication API',
@@ -186,9 +278,22 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 
+REDIS_URL = 'redis://127.0.0.1:6379/1'
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
-        'LOCATION': 'redis://127.0.0.1:6379/1',
+        'LOCATION': REDIS_URL,
     }
-}
\ No newline at end of file
+}
+
+CELERY_BEAT_SCHEDULE = {
+    'dispatch-due-retries': {
+        'task': 'destinations.tasks.dispatch_due_retries',
+        'schedule': 10.0,
+    },
+    'purge-expired-logs': {
+        'task': 'destinations.tasks.purge_expired_logs',
+        'schedule': 60.0 * 60,
+    },
+}
@@ -0,0 +1,93 @@
+# destinations/async_views.py
+import math
+import uuid
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.authtoken.models import Token
+from accounts.token_cache import aresolve_account_id
+from .fanout import afan_out_events
+from .parsers import loads
+from .routing import aget_routing_table
+from .throttling import throttle_account
+from .views import validate_event, app_token_key, account_error, claim_event_reply, buffer_event, fan_out_error, fan_out_reply
+
+async def _aauthenticate(request):
+    # Mirrors rest_framework TokenAuthentication ("Authorization: Token <key>") with the async ORM
+    auth = request.headers.get('Authorization', '').split()
+    if len(auth) != 2 or auth[0].lower() != 'token':
+        return None
+    try:
+        token = await Token.objects.select_related('user').aget(key=auth[1])
+    except Token.DoesNotExist:
+        return None
+    if not token.user.is_active:
+        return None
+    return token.user
+
+def _reply(reply):
+    body, code = reply
+    return JsonResponse(body, status=code)
+
+@csrf_exempt
+async def async_data_handler(request):
+    """
+    ASGI-native variant of DataHandlerView with the same headers, body and responses.
+    Token, routing and fan-out lookups use the async ORM and cache; the Redis throttle,
+    idempotency claims, stream appends and broker publishes still run in executor threads.
+    """
+    if request.method != 'POST':
+        return JsonResponse({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+
+    user = await _aauthenticate(request)
+    if user is None:
+        return JsonResponse({"detail": "Invalid token or authentication credentials were not provided."}, status=401)
+
+    app_secret_token = request.headers.get('CL-X-TOKEN')
+    client_event_id = request.headers.get('CL-X-EVENT-ID')
+    event_id = client_event_id or str(uuid.uuid4())
+    try:
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        content_length = 0
+    if content_length > settings.API_MAX_BODY_SIZE:
+        return JsonResponse({"detail": "Request body exceeds the maximum allowed size."}, status=413)
+    try:
+        data = loads(request.body)
+    except ValueError:
+        data = None
+    reply = validate_event(app_secret_token, client_event_id, data)
+    if reply:
+        return _reply(reply)
+
+    try:
+        account_id = await aresolve_account_id(user.id, app_token_key(app_secret_token))
+    except Exception as e:
+        return _reply(account_error(app_secret_token, e))
+    if not account_id:
+        return _reply(account_error(app_secret_token))
+
+    allowed, retry_after = await sync_to_async(throttle_account, thread_sensitive=False)(account_id)
+    if not allowed:
+        wait = math.ceil(retry_after)
+        response = JsonResponse({"detail": f"Request was throttled. Expected available in {wait} seconds."}, status=429)
+        response['Retry-After'] = str(wait)
+        return response
+
+    destination_ids = [route['id'] for route in (await aget_routing_table(account_id))['routes']]
+    if not destination_ids:
+        return JsonResponse({"error": "No destinations for this account"}, status=400)
+
+    reply = await sync_to_async(claim_event_reply, thread_sensitive=False)(account_id, event_id, client_event_id)
+    if reply:
+        return _reply(reply)
+
+    if settings.INGEST_WRITE_BEHIND:
+        return _reply(await sync_to_async(buffer_event, thread_sensitive=False)(account_id, event_id, data, client_event_id))
+
+    try:
+        result = await afan_out_events(account_id, destination_ids, [(event_id, data)])
+    except Exception as e:
+        return _reply(await sync_to_async(fan_out_error)(e, account_id, destination_ids, event_id, client_event_id))
+    return _reply(await sync_to_async(fan_out_reply, thread_sensitive=False)(result, account_id, event_id, client_event_id))
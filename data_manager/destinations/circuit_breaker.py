@@ -0,0 +1,118 @@
+# destinations/circuit_breaker.py
+import logging
+import redis
+from django.conf import settings
+from data_manager.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Per-destination circuit state lives in a Redis hash so every worker sees the same circuit:
+#   closed    -> deliveries flow; consecutive failures inside the window are counted
+#   open      -> deliveries are parked until CIRCUIT_OPEN_SECONDS after opening
+#   half_open -> one probe per CIRCUIT_PROBE_INTERVAL; success closes, failure re-opens
+
+_NOW = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+"""
+
+ALLOW_LUA = _NOW + """
+local open_ms = tonumber(ARGV[1])
+local probe_ms = tonumber(ARGV[2])
+local state = redis.call('HGET', KEYS[1], 'state')
+if not state or state == 'closed' then
+    return {1, 0}
+end
+if state == 'open' then
+    local reopen_at = tonumber(redis.call('HGET', KEYS[1], 'opened_at')) + open_ms
+    if now < reopen_at then
+        return {0, reopen_at - now}
+    end
+    redis.call('HSET', KEYS[1], 'state', 'half_open')
+end
+if redis.call('SET', KEYS[2], 1, 'NX', 'PX', probe_ms) then
+    return {1, 0}
+end
+return {0, math.max(redis.call('PTTL', KEYS[2]), 1)}
+"""
+
+RECORD_LUA = _NOW + """
+local success = ARGV[1] == '1'
+local threshold = tonumber(ARGV[2])
+local window_ms = tonumber(ARGV[3])
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+if success then
+    if state == 'closed' then
+        redis.call('HDEL', KEYS[1], 'failures', 'window_start')
+    else
+        redis.call('DEL', KEYS[1])
+    end
+    return 'closed'
+end
+if state == 'half_open' then
+    redis.call('HSET', KEYS[1], 'state', 'open', 'opened_at', now)
+    return 'open'
+end
+if state == 'open' then
+    return 'open'
+end
+local window_start = tonumber(redis.call('HGET', KEYS[1], 'window_start'))
+if not window_start or now - window_start > window_ms then
+    redis.call('HSET', KEYS[1], 'failures', 0, 'window_start', now)
+end
+local failures = redis.call('HINCRBY', KEYS[1], 'failures', 1)
+redis.call('PEXPIRE', KEYS[1], 86400000)
+if failures >= threshold then
+    redis.call('HSET', KEYS[1], 'state', 'open', 'opened_at', now)
+    return 'open'
+end
+return 'closed'
+"""
+
+_scripts = {}
+
+def _script(source):
+    client = get_redis()
+    key = (id(client), source)
+    if key not in _scripts:
+        _scripts[key] = client.register_script(source)
+    return _scripts[key]
+
+def _key(destination_id):
+    return f"circuit:{destination_id}"
+
+def allow(destination_id):
+    """
+    Returns (allowed, retry_after_seconds) for one delivery to the destination.
+    Allows the delivery when Redis is unavailable.
+    """
+    try:
+        allowed, retry_after_ms = _script(ALLOW_LUA)(
+            keys=[_key(destination_id), f"{_key(destination_id)}:probe"],
+            args=[settings.CIRCUIT_OPEN_SECONDS * 1000, settings.CIRCUIT_PROBE_INTERVAL * 1000]
+        )
+    except redis.RedisError as e:
+        logger.warning(f"Circuit breaker unavailable, allowing delivery: {str(e)}")
+        return True, 0
+    return bool(allowed), retry_after_ms / 1000
+
+def record(destination_id, healthy):
+    try:
+        state = _script(RECORD_LUA)(
+            keys=[_key(destination_id)],
+            args=[1 if healthy else 0, settings.CIRCUIT_FAILURE_THRESHOLD, settings.CIRCUIT_FAILURE_WINDOW * 1000]
+        )
+    except redis.RedisError as e:
+        logger.warning(f"Circuit breaker unavailable, result not recorded: {str(e)}")
+        return
+    if state == b'open' and not healthy:
+        logger.warning(f"Circuit open for destination {destination_id}")
+
+def get_state(destination_id):
+    circuit = {key.decode(): value.decode() for key, value in get_redis().hgetall(_key(destination_id)).items()}
+    return {
+        'destination': destination_id,
+        'state': circuit.get('state', 'closed'),
+        'failures': int(circuit.get('failures', 0)),
+        'opened_at_ms': int(circuit['opened_at']) if 'opened_at' in circuit else None,
+    }
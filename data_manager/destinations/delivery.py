@@ -0,0 +1,213 @@
+# destinations/delivery.py
+import time
+import random
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from . import http_client, circuit_breaker, rate_limits
+from .models import Log
+from .routing import merged_headers
+
+logger = logging.getLogger(__name__)
+
+# Log columns written back after a delivery attempt
+UPDATE_FIELDS = [
+    'status', 'processed_timestamp', 'attempts', 'next_attempt_at',
+    'response_status', 'duration_ms', 'response_bytes', 'error_class', 'error_message',
+]
+
+# Client errors that will not go away by retrying the same request
+RETRYABLE_CLIENT_ERRORS = (408, 425, 429)
+
+def is_batching(destination):
+    return destination.batch_max_size > 1
+
+def request_kwargs(logs):
+    # Batching destinations always receive a JSON array, even for a single event
+    destination = logs[0].destination
+    return {
+        'method': destination.http_method,
+        'url': destination.url,
+        'headers': merged_headers(destination.headers),
+        'json': [log.payload_data for log in logs] if is_batching(destination) else logs[0].payload_data,
+    }
+
+def delivery_groups(logs):
+    """
+    Splits logs into the requests that deliver them: one log per request, except for
+    batching destinations whose logs are coalesced into chunks of batch_max_size.
+    """
+    batches = {}
+    for log in logs:
+        if not is_batching(log.destination):
+            yield [log]
+            continue
+        batch = batches.setdefault(log.destination_id, [])
+        batch.append(log)
+        if len(batch) >= log.destination.batch_max_size:
+            yield batches.pop(log.destination_id)
+    yield from batches.values()
+
+def claim_logs(limit, exclude_destination_ids=(), **filters):
+    # SKIP LOCKED lets several workers claim disjoint batches (no-op on SQLite, which serializes writers)
+    with transaction.atomic():
+        ids = list(
+            Log.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', **filters).exclude(destination_id__in=exclude_destination_ids)
+            .order_by('id').values_list('id', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        Log.objects.filter(id__in=ids).update(status='processing', claimed_at=timezone.now())
+    return list(Log.objects.filter(id__in=ids).select_related('account', 'destination', 'payload'))
+
+def requeue_parked(log_ids):
+    """
+    Moves the given parked logs back to pending once due and returns their ids. Logs already
+    dispatched, delivered or parked again for later are left alone, so a late or duplicate
+    requeue never runs a delivery early.
+    """
+    with transaction.atomic():
+        ids = list(
+            Log.objects.select_for_update(skip_locked=True)
+            .filter(id__in=log_ids, status='retrying', next_attempt_at__lte=timezone.now())
+            .values_list('id', flat=True)
+        )
+        Log.objects.filter(id__in=ids).update(status='pending', next_attempt_at=None)
+    return ids
+
+def release_claims(log_ids):
+    # Hands claimed logs back untouched, e.g. ones a worker has no free slot for
+    return Log.objects.filter(id__in=log_ids, status='processing').update(status='pending', claimed_at=None)
+
+def release_stale_claims(lease_seconds, **filters):
+    # Logs held by a worker that died mid-delivery go back to pending; returns their ids
+    cutoff = timezone.now() - timedelta(seconds=lease_seconds)
+    with transaction.atomic():
+        ids = list(
+            Log.objects.select_for_update(skip_locked=True)
+            .filter(status='processing', claimed_at__lt=cutoff, **filters).values_list('id', flat=True)
+        )
+        Log.objects.filter(id__in=ids).update(status='pending', claimed_at=None)
+    return ids
+
+def outcome_from_response(status_code, response_bytes, started):
+    return {
+        'ok': 200 <= status_code < 300,
+        'status_code': status_code,
+        'response_bytes': response_bytes,
+        'duration_ms': int((time.perf_counter() - started) * 1000),
+        'error_class': '',
+        'error_message': '',
+    }
+
+def outcome_from_exception(exc, started):
+    return {
+        'ok': False,
+        'status_code': None,
+        'response_bytes': None,
+        'duration_ms': int((time.perf_counter() - started) * 1000),
+        'error_class': type(exc).__name__,
+        'error_message': str(exc),
+    }
+
+def deliver(logs):
+    # Blocking delivery of one request over the pooled per-process session
+    destination = logs[0].destination
+    started = time.perf_counter()
+    try:
+        response = http_client.send(
+            timeout=(destination.connect_timeout, destination.read_timeout),
+            **request_kwargs(logs)
+        )
+    except Exception as e:
+        return outcome_from_exception(e, started)
+    return outcome_from_response(response.status_code, len(response.content), started)
+
+def is_retryable(outcome):
+    status_code = outcome['status_code']
+    if status_code is None:
+        return True
+    return not (400 <= status_code < 500) or status_code in RETRYABLE_CLIENT_ERRORS
+
+def retry_delay(attempts):
+    # Exponential backoff with equal jitter: half the delay is fixed, half random
+    delay = min(settings.RETRY_BACKOFF_MAX, settings.RETRY_BACKOFF_BASE * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def is_healthy(outcome):
+    # Non-retryable 4xx still means the receiver is up, so it does not trip the circuit
+    return outcome['ok'] or not is_retryable(outcome)
+
+def park(logs, delay):
+    # Defers the logs without spending an attempt. Callers requeue them when due (requeue_parked);
+    # the retry dispatcher is the fallback if that is lost
+    next_attempt_at = timezone.now() + timedelta(seconds=delay + random.uniform(0, 1))
+    for log in logs:
+        log.status = 'retrying'
+        log.next_attempt_at = next_attempt_at
+    logger.info(f"Delivery of logs {[log.id for log in logs]} parked for {delay:.1f}s")
+
+def deliver_logs(logs):
+    """
+    Delivers logs one request after another (see delivery_groups), parking those whose
+    destination circuit is open or whose max_rps / max_concurrency is exhausted.
+    Outcomes are applied in memory; callers persist UPDATE_FIELDS, then requeue the
+    returned parked logs.
+    """
+    blocked, parked = {}, []
+    for group in delivery_groups(logs):
+        destination = group[0].destination
+        if destination.id in blocked:
+            park(group, blocked[destination.id])
+            parked.extend(group)
+            continue
+        allowed, retry_after = circuit_breaker.allow(destination.id)
+        if allowed:
+            allowed, retry_after = rate_limits.acquire(destination, str(group[0].id))
+        if not allowed:
+            blocked[destination.id] = retry_after
+            park(group, retry_after)
+            parked.extend(group)
+            continue
+        try:
+            outcome = deliver(group)
+        finally:
+            rate_limits.release(destination, str(group[0].id))
+        circuit_breaker.record(destination.id, is_healthy(outcome))
+        for log in group:
+            apply_outcome(log, outcome)
+    return parked
+
+def apply_outcome(log, outcome):
+    """
+    Records a delivery outcome (status, response metrics, error) on the log in memory;
+    callers persist UPDATE_FIELDS.
+    Retryable failures are rescheduled with backoff until the destination's max_attempts,
+    after which the log is dead-lettered.
+    """
+    now = timezone.now()
+    log.attempts += 1
+    log.processed_timestamp = now
+    log.next_attempt_at = None
+    if outcome['ok']:
+        log.status = 'success'
+    elif not is_retryable(outcome):
+        log.status = 'failed'
+    elif log.attempts >= log.destination.max_attempts:
+        log.status = 'dead'
+    else:
+        log.status = 'retrying'
+        log.next_attempt_at = now + timedelta(seconds=retry_delay(log.attempts))
+
+    log.response_status = outcome['status_code']
+    log.duration_ms = outcome['duration_ms']
+    log.response_bytes = outcome['response_bytes']
+    log.error_class = outcome['error_class'][:Log._meta.get_field('error_class').max_length]
+    log.error_message = outcome['error_message'][:Log._meta.get_field('error_message').max_length]
+    if outcome['error_class']:
+        logger.error(f"Delivery of log {log.id} failed (attempt {log.attempts}, status={log.status}): {outcome['error_message']}")
+    else:
+        logger.info(f"Delivery of log {log.id} completed: Status={log.status}, URL={log.destination.url}, HTTP Code={outcome['status_code']}, Attempt={log.attempts}")
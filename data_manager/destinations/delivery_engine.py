@@ -0,0 +1,180 @@
+# destinations/delivery_engine.py
+import asyncio
+import contextlib
+import heapq
+import logging
+import time
+import httpx
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from data_manager.cache_namespace import bump
+from . import circuit_breaker, rate_limits
+from .delivery import (
+    request_kwargs, outcome_from_response, outcome_from_exception, apply_outcome, is_healthy, park,
+    delivery_groups, claim_logs, release_claims, release_stale_claims, requeue_parked, UPDATE_FIELDS
+)
+from .models import Log
+
+logger = logging.getLogger(__name__)
+
+def write_results(logs):
+    Log.objects.bulk_update(logs, UPDATE_FIELDS + ['claimed_at'], batch_size=500)
+    bump('logs', *{log.account_id for log in logs})
+
+class DeliveryEngine:
+    """
+    Delivers pending logs from a single asyncio event loop: claims them in batches,
+    keeps up to max_in_flight requests open (at most per_destination per destination; logs of a
+    saturated destination are left unclaimed so a slow receiver cannot crowd out the others),
+    coalescing the claimed logs of batching destinations into one request per chunk, and writes outcomes back with one bulk_update per flush_interval.
+    Logs parked by a destination limit are requeued by the engine itself as soon as they are due.
+    """
+    def __init__(self, batch_size=500, max_in_flight=1000, per_destination=50, poll_interval=1.0, flush_interval=0.5, lease_seconds=600):
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.per_destination = per_destination
+        self.poll_interval = poll_interval
+        self.flush_interval = flush_interval
+        self.lease_seconds = lease_seconds
+        self._active = {}
+        self._results = []
+        self._parked_ids = set()
+        self._parked = []
+        self._stopping = False
+
+    def stop(self):
+        self._stopping = True
+
+    async def run(self):
+        limits = httpx.Limits(max_connections=self.max_in_flight, max_keepalive_connections=self.max_in_flight)
+        async with httpx.AsyncClient(limits=limits) as client:
+            writer = asyncio.create_task(self._write_loop())
+            in_flight = set()
+            last_reclaim = 0
+            while not self._stopping:
+                if time.monotonic() - last_reclaim > self.lease_seconds / 2:
+                    released = await sync_to_async(release_stale_claims)(self.lease_seconds)
+                    if released:
+                        logger.warning(f"Released {len(released)} stale delivery claims")
+                    last_reclaim = time.monotonic()
+
+                await self._requeue_due()
+                if len(in_flight) >= self.max_in_flight:
+                    await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                if not await self._claim_and_start(client, in_flight):
+                    # Nothing claimable: idle until the next poll, a parked log falls due or a slot frees up
+                    if in_flight:
+                        await asyncio.wait(in_flight, timeout=self._idle_interval(), return_when=asyncio.FIRST_COMPLETED)
+                    else:
+                        await asyncio.sleep(self._idle_interval())
+
+            if in_flight:
+                await asyncio.gather(*in_flight, return_exceptions=True)
+            writer.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await writer
+            await self._flush()
+
+    async def _claim_and_start(self, client, in_flight):
+        """
+        Claims pending logs of destinations with a free slot and starts one request per delivery
+        group, so every task in in_flight is a running request. Groups beyond a destination's
+        per_destination slots go straight back to pending rather than waiting while claimed.
+        Returns the number of requests started.
+        """
+        saturated = [destination_id for destination_id, active in self._active.items() if active >= self.per_destination]
+        logs = await sync_to_async(claim_logs)(min(self.batch_size, self.max_in_flight - len(in_flight)), exclude_destination_ids=saturated)
+        started, surplus = 0, []
+        for group in delivery_groups(logs):
+            destination_id = group[0].destination_id
+            if len(in_flight) >= self.max_in_flight or self._active.get(destination_id, 0) >= self.per_destination:
+                surplus.extend(log.id for log in group)
+                continue
+            self._active[destination_id] = self._active.get(destination_id, 0) + 1
+            task = asyncio.create_task(self._deliver(client, group))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            task.add_done_callback(lambda _, destination_id=destination_id: self._free_slot(destination_id))
+            started += 1
+        if surplus:
+            await sync_to_async(release_claims)(surplus)
+        return started
+
+    def _free_slot(self, destination_id):
+        self._active[destination_id] -= 1
+        if not self._active[destination_id]:
+            del self._active[destination_id]
+
+    async def _deliver(self, client, logs):
+        destination = logs[0].destination
+        allowed, retry_after = await sync_to_async(circuit_breaker.allow, thread_sensitive=False)(destination.id)
+        if allowed:
+            allowed, retry_after = await sync_to_async(rate_limits.acquire, thread_sensitive=False)(destination, str(logs[0].id))
+        if not allowed:
+            park(logs, retry_after)
+            self._parked_ids.update(log.id for log in logs)
+            self._finish(logs)
+            return
+        started = time.perf_counter()
+        try:
+            response = await client.request(
+                timeout=httpx.Timeout(destination.read_timeout, connect=destination.connect_timeout),
+                **request_kwargs(logs)
+            )
+            outcome = outcome_from_response(response.status_code, len(response.content), started)
+        except Exception as e:
+            outcome = outcome_from_exception(e, started)
+        finally:
+            await sync_to_async(rate_limits.release, thread_sensitive=False)(destination, str(logs[0].id))
+        await sync_to_async(circuit_breaker.record, thread_sensitive=False)(destination.id, is_healthy(outcome))
+        for log in logs:
+            apply_outcome(log, outcome)
+        self._finish(logs)
+
+    def _finish(self, logs):
+        for log in logs:
+            log.claimed_at = None
+        self._results.extend(logs)
+
+    async def _write_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._flush()
+
+    async def _flush(self):
+        if not self._results:
+            return
+        logs, self._results = self._results, []
+        try:
+            await sync_to_async(write_results)(logs)
+        except Exception as e:
+            logger.error(f"Failed to write back {len(logs)} delivery results, retrying: {str(e)}")
+            self._results = logs + self._results
+            return
+        # Parked logs can only be requeued once their 'retrying' status is written
+        for log in logs:
+            if log.id in self._parked_ids:
+                self._parked_ids.discard(log.id)
+                heapq.heappush(self._parked, (log.next_attempt_at, log.id))
+
+    def _idle_interval(self):
+        # Wake up for the next parked log if it is due before the next poll
+        if not self._parked:
+            return self.poll_interval
+        due_in = (self._parked[0][0] - timezone.now()).total_seconds()
+        return min(self.poll_interval, max(due_in, 0))
+
+    async def _requeue_due(self):
+        # Due parked logs go back to pending and are claimed by this same loop iteration;
+        # the retry dispatcher only sees the ones this process did not get to
+        now = timezone.now()
+        log_ids = []
+        while self._parked and self._parked[0][0] <= now:
+            log_ids.append(heapq.heappop(self._parked)[1])
+        if not log_ids:
+            return
+        try:
+            await sync_to_async(requeue_parked)(log_ids)
+        except Exception as e:
+            logger.error(f"Failed to requeue {len(log_ids)} parked logs, leaving them to the retry dispatcher: {str(e)}")
@@ -0,0 +1,25 @@
+# destinations/export.py
+from django.conf import settings
+
+# Export columns, named like LogSerializer's fields
+LOG_EXPORT_FIELDS = [
+    'event_id', 'account', 'destination', 'received_timestamp', 'processed_timestamp', 'received_data', 'status',
+    'attempts', 'next_attempt_at', 'response_status', 'duration_ms', 'response_bytes', 'error_class', 'error_message',
+]
+
+_COLUMNS = {'account': 'account_id', 'destination': 'destination_id'}
+
+def export_rows(queryset):
+    """
+    Yields one dict per log of the (filtered, ordered) Log queryset. Rows are read with
+    .values() through .iterator(), i.e. a server-side cursor on PostgreSQL, so memory
+    stays flat however many logs are exported.
+    """
+    columns = [_COLUMNS.get(field, field) for field in LOG_EXPORT_FIELDS if field != 'received_data']
+    rows = queryset.values(*columns, 'payload__data', 'received_data').iterator(chunk_size=settings.LOG_EXPORT_CHUNK_SIZE)
+    for row in rows:
+        payload = row['payload__data']
+        yield {
+            field: (payload if payload is not None else row['received_data']) if field == 'received_data' else row[_COLUMNS.get(field, field)]
+            for field in LOG_EXPORT_FIELDS
+        }
@@ -0,0 +1,111 @@
+# destinations/fanout.py
+import logging
+from collections import namedtuple
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from data_manager.cache_namespace import bump, abump
+from .models import Log
+from .payloads import store_payloads
+from .queues import delivery_queue
+from .routing import get_routing_table, aget_routing_table
+from .tasks import send_to_destination_batch
+
+logger = logging.getLogger(__name__)
+
+FanOutResult = namedtuple('FanOutResult', ['queued', 'failed', 'failed_events'])
+
+
+def existing_events(destination_ids, event_ids):
+    # Event ids that already have Log rows, i.e. retries that outlived the Redis dedup window
+    log_event_ids = {
+        f"{event_id}-{destination_id}": event_id
+        for event_id in event_ids
+        for destination_id in destination_ids
+    }
+    found = Log.objects.filter(event_id__in=list(log_event_ids)).values_list('event_id', flat=True)
+    return {log_event_ids[log_event_id] for log_event_id in found}
+
+
+def fan_out_event(account_id, destination_ids, event_id, data):
+    return fan_out_events(account_id, destination_ids, [(event_id, data)])
+
+
+def _build_logs(account_id, destination_ids, events, payload_ids):
+    return [
+        Log(
+            event_id=f"{event_id}-{destination_id}",
+            account_id=account_id,
+            destination_id=destination_id,
+            payload_id=payload_id,
+            status='pending'
+        )
+        for (event_id, _), payload_id in zip(events, payload_ids)
+        for destination_id in destination_ids
+    ]
+
+
+def _fan_out_result(destination_ids, events, logs, queued, failed):
+    # bulk_create keeps input order, so each event owns a contiguous run of len(destination_ids) logs
+    failed_ids = set(failed)
+    failed_events = {
+        events[index // len(destination_ids)][0]
+        for index, log in enumerate(logs) if log.id in failed_ids
+    }
+    return FanOutResult(queued=queued, failed=failed, failed_events=failed_events)
+
+
+def _insert_logs(account_id, destination_ids, events):
+    # One INSERT for all events and destinations; rows are committed before any task can pick them up.
+    # The payloads are stored in the same transaction, which keeps reused ones locked against the
+    # retention purge until the logs referencing them are committed.
+    with transaction.atomic():
+        payload_ids = store_payloads([data for _, data in events])
+        return Log.objects.bulk_create(_build_logs(account_id, destination_ids, events, payload_ids))
+
+
+def fan_out_events(account_id, destination_ids, events):
+    logs = _insert_logs(account_id, destination_ids, events)
+    queue = delivery_queue(account_id, get_routing_table(account_id).get('priority', 'normal'))
+    queued, failed = publish_deliveries([log.id for log in logs], queue)
+    bump('logs', account_id)
+    return _fan_out_result(destination_ids, events, logs, queued, failed)
+
+
+async def afan_out_events(account_id, destination_ids, events):
+    # The async ORM has no transactions, so payloads and logs are written by the sync helper
+    logs = await sync_to_async(_insert_logs)(account_id, destination_ids, events)
+    queue = delivery_queue(account_id, (await aget_routing_table(account_id)).get('priority', 'normal'))
+    queued, failed = await sync_to_async(publish_deliveries, thread_sensitive=False)([log.id for log in logs], queue)
+    await abump('logs', account_id)
+    return _fan_out_result(destination_ids, events, logs, queued, failed)
+
+
+def publish_deliveries(log_ids, queue=None):
+    # queue is the accounts' delivery queue (see queues.delivery_queue); None means the default queue
+    if settings.DELIVERY_BACKEND == 'engine':
+        # The asyncio delivery engine claims pending logs straight from the database
+        return list(log_ids), []
+    # Publish over a single pooled broker connection and remember which messages did not make it
+    # Each message carries up to DELIVERY_BATCH_SIZE logs for send_to_destination_batch
+    queued, failed = [], []
+    batch_size = settings.DELIVERY_BATCH_SIZE
+    try:
+        with send_to_destination_batch.app.producer_or_acquire() as producer:
+            for start in range(0, len(log_ids), batch_size):
+                chunk = list(log_ids[start:start + batch_size])
+                try:
+                    send_to_destination_batch.apply_async((chunk,), producer=producer, queue=queue)
+                    queued.extend(chunk)
+                except Exception as e:
+                    logger.error(f"Failed to enqueue logs {chunk}: {str(e)}")
+                    failed.extend(chunk)
+    except Exception as e:
+        logger.error(f"Broker connection failed while enqueueing logs: {str(e)}")
+        handled = set(queued) | set(failed)
+        failed.extend(log_id for log_id in log_ids if log_id not in handled)
+    if failed:
+        # Never leave rows pending without a task; the retry dispatcher republishes them
+        Log.objects.filter(id__in=failed, status='pending').update(status='retrying', next_attempt_at=timezone.now())
+    return queued, failed
@@ -0,0 +1,91 @@
+# destinations/filters.py
+import re
+import logging
+from django.db import connection
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+# Query parameter -> (lookup, parser); invalid values are logged and ignored
+LOG_FILTERS = {
+    'status': ('status', str),
+    'destination_id': ('destination_id', int),
+    'received_timestamp__gte': ('received_timestamp__gte', parse_datetime),
+    'received_timestamp__lte': ('received_timestamp__lte', parse_datetime),
+    'response_status': ('response_status', int),
+    'response_status__gte': ('response_status__gte', int),
+    'response_status__lte': ('response_status__lte', int),
+    'duration_ms__gte': ('duration_ms__gte', int),
+    'duration_ms__lte': ('duration_ms__lte', int),
+    'error_class': ('error_class', str),
+}
+
+# ?event_id_match= modes for ?event_id=
+EVENT_ID_MATCH_MODES = ('exact', 'prefix', 'contains')
+EVENT_ID_DEFAULT_MATCH = 'contains'
+
+LOG_ORDERING_FIELDS = ['received_timestamp', 'processed_timestamp', 'duration_ms', 'response_status', 'response_bytes', 'attempts']
+LOG_DEFAULT_ORDERING = '-received_timestamp'
+
+def _prefix_filter(prefix):
+    if connection.vendor == 'sqlite':
+        # SQLite's LIKE is case-insensitive and cannot use the index; a range on the BINARY collation can
+        return Q(event_id__gte=prefix, event_id__lt=prefix[:-1] + chr(ord(prefix[-1]) + 1))
+    # PostgreSQL serves LIKE 'prefix%' from the unique index's varchar_pattern_ops twin
+    return Q(event_id__startswith=prefix)
+
+def filter_event_id(queryset, value, mode):
+    """
+    exact: the client's event id (stored as '<event_id>-<destination_id>') or a full log event id.
+    prefix: event ids starting with value; both use the unique event_id index.
+    contains: case-insensitive substring, served by the pg_trgm index on PostgreSQL and by
+    scanning the account's rows elsewhere.
+    """
+    if mode == 'exact':
+        return queryset.filter(
+            Q(event_id=value)
+            | _prefix_filter(f"{value}-") & Q(event_id__regex=rf"^{re.escape(value)}-[0-9]+$")
+        )
+    if mode == 'prefix':
+        return queryset.filter(_prefix_filter(value))
+    return queryset.filter(event_id__icontains=value)
+
+def filter_logs(queryset, params):
+    """
+    Applies the LogListView query parameters (LOG_FILTERS and ?ordering=) to a Log queryset.
+    The result is always ordered by (ordering field, id), which keyset pagination relies on,
+    with NULL values of nullable fields last.
+    """
+    for param, (lookup, parse) in LOG_FILTERS.items():
+        value = params.get(param, '')
+        if not value:
+            continue
+        try:
+            parsed = parse(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            logger.warning(f"Invalid {param}: {value}")
+            continue
+        queryset = queryset.filter(**{lookup: parsed})
+
+    event_id = params.get('event_id', '')
+    if event_id:
+        mode = params.get('event_id_match', '') or EVENT_ID_DEFAULT_MATCH
+        if mode not in EVENT_ID_MATCH_MODES:
+            logger.warning(f"Invalid event_id_match: {mode}")
+            mode = EVENT_ID_DEFAULT_MATCH
+        queryset = filter_event_id(queryset, event_id, mode)
+
+    ordering = params.get('ordering', '') or LOG_DEFAULT_ORDERING
+    if ordering.lstrip('-') not in LOG_ORDERING_FIELDS:
+        logger.warning(f"Invalid ordering: {ordering}")
+        ordering = LOG_DEFAULT_ORDERING
+    field, descending = ordering.lstrip('-'), ordering.startswith('-')
+    if queryset.model._meta.get_field(field).null:
+        # Logs without a value yet (e.g. duration_ms of a pending log) come last in either
+        # direction; databases disagree on where NULLs sort by default
+        ordering = F(field).desc(nulls_last=True) if descending else F(field).asc(nulls_last=True)
+    # id breaks ties so the order is stable
+    return queryset.order_by(ordering, '-id' if descending else 'id')
@@ -0,0 +1,97 @@
+# destinations/http_client.py
+import os
+import json
+import time
+import socket
+import logging
+import threading
+import redis
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from data_manager.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_session = None
+_session_pid = None
+_stats_published_at = 0
+
+def get_session():
+    """
+    Per-process requests.Session whose adapter keeps a keep-alive pool per destination host,
+    so deliveries over a pooled connection skip the TCP and TLS handshakes. A connection the
+    pool has to open does a full TLS handshake: urllib3 does not resume TLS sessions across
+    connections. Recreated after fork so Celery prefork children never share sockets with the parent.
+    """
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        with _lock:
+            if _session is None or _session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=settings.DELIVERY_POOL_HOSTS,
+                    pool_maxsize=settings.DELIVERY_POOL_MAXSIZE,
+                    max_retries=0
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session, _session_pid = session, os.getpid()
+    return _session
+
+def send(method, url, headers, json, timeout):
+    # timeout is (connect, read) in seconds; a hung receiver can no longer pin the worker
+    try:
+        return get_session().request(method=method, url=url, headers=headers, json=json, timeout=timeout)
+    finally:
+        _publish_stats()
+
+def _stats_key():
+    return f"http_pool_stats:{socket.gethostname()}:{os.getpid()}"
+
+def _publish_stats():
+    # Each process holds its own pool, so each leaves a snapshot for report_http_pool_stats to collect
+    global _stats_published_at
+    interval = settings.DELIVERY_POOL_STATS_INTERVAL
+    if time.monotonic() - _stats_published_at < interval:
+        return
+    _stats_published_at = time.monotonic()
+    try:
+        get_redis().set(_stats_key(), json.dumps(pool_stats()), ex=interval * 3)
+    except redis.RedisError as e:
+        logger.warning(f"Failed to publish HTTP pool stats: {str(e)}")
+
+def all_pool_stats():
+    """
+    Latest pool_stats() snapshot of every process that delivered in the last few
+    DELIVERY_POOL_STATS_INTERVALs, keyed by '<hostname>:<pid>'.
+    """
+    client = get_redis()
+    keys = list(client.scan_iter(match='http_pool_stats:*', count=1000))
+    return {
+        key.decode().split(':', 1)[1]: json.loads(value)
+        for key, value in zip(keys, client.mget(keys) if keys else []) if value is not None
+    }
+
+def pool_stats():
+    """
+    Per-host pool statistics for this process: connections opened, requests sent
+    and connections currently idle in the pool.
+    """
+    if _session is None or _session_pid != os.getpid():
+        return []
+    stats = []
+    for adapter in {id(adapter): adapter for adapter in _session.adapters.values()}.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats.append({
+                'host': f"{pool.scheme}://{pool.host}:{pool.port}",
+                'connections_opened': pool.num_connections,
+                'requests': pool.num_requests,
+                'idle_connections': pool.pool.qsize() if pool.pool is not None else 0,
+            })
+    return stats
@@ -0,0 +1,71 @@
+# destinations/idempotency.py
+import logging
+import redis
+from django.conf import settings
+from data_manager.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+def _key(account_id, event_id):
+    return f"event_seen:{account_id}:{event_id}"
+
+# A claim is IN_FLIGHT until the request stored the event, then ACCEPTED for the dedup window
+IN_FLIGHT = b'in_flight'
+ACCEPTED = b'accepted'
+
+def claim_events(account_id, event_ids):
+    """
+    Reserves each CL-X-EVENT-ID for EVENT_ID_INFLIGHT_TIMEOUT seconds using SET NX, pipelined
+    into one round-trip. Returns (claimed, in_flight): the ids reserved by this call and the
+    ids another request reserved but has not stored yet. The rest were accepted before.
+    Claimed ids must be confirmed with accept_events once stored, or given back with release_events.
+    """
+    if not event_ids:
+        return set(), set()
+    pipeline = get_redis().pipeline(transaction=False)
+    for event_id in event_ids:
+        pipeline.set(_key(account_id, event_id), IN_FLIGHT, nx=True, ex=settings.EVENT_ID_INFLIGHT_TIMEOUT)
+        pipeline.get(_key(account_id, event_id))
+    try:
+        replies = pipeline.execute()
+    except redis.RedisError as e:
+        # Fail open: the unique Log.event_id constraint still rejects real duplicates
+        logger.warning(f"Event id dedup unavailable, accepting events unchecked: {str(e)}")
+        return set(event_ids), set()
+    claimed, in_flight = set(), set()
+    for event_id, is_new, state in zip(event_ids, replies[::2], replies[1::2]):
+        if is_new:
+            claimed.add(event_id)
+        elif state != ACCEPTED:
+            # Still reserved by a running request, or its reservation just lapsed
+            in_flight.add(event_id)
+    return claimed, in_flight
+
+def claim_event(account_id, event_id):
+    """
+    Returns None when the id was claimed by this call, otherwise IN_FLIGHT or ACCEPTED.
+    """
+    claimed, in_flight = claim_events(account_id, [event_id])
+    if claimed:
+        return None
+    return IN_FLIGHT if in_flight else ACCEPTED
+
+def accept_events(account_id, event_ids):
+    # The events are stored: remember their ids for the full dedup window
+    if not event_ids:
+        return
+    pipeline = get_redis().pipeline(transaction=False)
+    for event_id in event_ids:
+        pipeline.set(_key(account_id, event_id), ACCEPTED, ex=settings.EVENT_ID_DEDUP_TIMEOUT)
+    try:
+        pipeline.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Failed to confirm event ids {event_ids}: {str(e)}")
+
+def release_events(account_id, event_ids):
+    # Called when ingest fails after claiming, so the client's retry is not rejected as a duplicate
+    if event_ids:
+        try:
+            get_redis().delete(*[_key(account_id, event_id) for event_id in event_ids])
+        except redis.RedisError as e:
+            logger.warning(f"Failed to release event ids {event_ids}: {str(e)}")
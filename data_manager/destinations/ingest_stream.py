@@ -0,0 +1,155 @@
+# destinations/ingest_stream.py
+import json
+import logging
+import redis
+from django.conf import settings
+from django.db import IntegrityError, InterfaceError, OperationalError
+from data_manager.redis_client import get_redis
+from .fanout import fan_out_events, existing_events
+from .routing import get_routing_table
+
+logger = logging.getLogger(__name__)
+
+def append_events(account_id, events):
+    """
+    Write-behind ingest: appends (event_id, data) pairs to the Redis stream in one pipelined
+    round-trip. Logs are created later by the flush_ingest_stream command.
+    """
+    pipeline = get_redis().pipeline(transaction=False)
+    for event_id, data in events:
+        pipeline.xadd(
+            settings.INGEST_STREAM_KEY,
+            {'account_id': account_id, 'event_id': event_id, 'data': json.dumps(data)},
+            maxlen=settings.INGEST_STREAM_MAXLEN,
+            approximate=True
+        )
+    return pipeline.execute()
+
+def ensure_group():
+    try:
+        get_redis().xgroup_create(settings.INGEST_STREAM_KEY, settings.INGEST_STREAM_GROUP, id='0', mkstream=True)
+    except redis.ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+def read_entries(consumer, count, block_ms=None, pending_after=None):
+    # pending_after re-reads entries delivered to this consumer but never acknowledged,
+    # starting after that id (crash recovery)
+    response = get_redis().xreadgroup(
+        settings.INGEST_STREAM_GROUP, consumer,
+        {settings.INGEST_STREAM_KEY: '>' if pending_after is None else pending_after},
+        count=count, block=block_ms if pending_after is None else None
+    )
+    return response[0][1] if response else []
+
+def claim_stalled_entries(consumer, min_idle_ms, count):
+    # Takes over entries left unacknowledged by a flusher that died
+    _, entries, *_ = get_redis().xautoclaim(
+        settings.INGEST_STREAM_KEY, settings.INGEST_STREAM_GROUP, consumer,
+        min_idle_time=min_idle_ms, start_id='0-0', count=count
+    )
+    return entries
+
+def _parse(fields):
+    return int(fields[b'account_id']), (fields[b'event_id'].decode(), json.loads(fields[b'data']))
+
+def _flush_events(account_id, events):
+    destination_ids = [route['id'] for route in get_routing_table(account_id)['routes']]
+    if not destination_ids:
+        logger.warning(f"Dropping {len(events)} buffered events for account {account_id}: no destinations")
+        return 0
+    try:
+        fan_out_events(account_id, destination_ids, events)
+    except IntegrityError:
+        # Entries redelivered after a crash between commit and XACK
+        already_logged = existing_events(destination_ids, [event_id for event_id, _ in events])
+        if not already_logged:
+            raise
+        events = [event for event in events if event[0] not in already_logged]
+        if events:
+            fan_out_events(account_id, destination_ids, events)
+    return len(events)
+
+def _ack(entry_ids):
+    if entry_ids:
+        get_redis().xack(settings.INGEST_STREAM_KEY, settings.INGEST_STREAM_GROUP, *entry_ids)
+
+def _fail_entries(failures):
+    """
+    Leaves entries that could not be flushed pending, to be claimed and retried, until they
+    have been delivered INGEST_FLUSH_MAX_DELIVERIES times; then moves them to the dead-letter
+    stream and acknowledges them so they stop blocking the flusher.
+    """
+    client = get_redis()
+    for entry_id, fields, exc in failures:
+        pending = client.xpending_range(settings.INGEST_STREAM_KEY, settings.INGEST_STREAM_GROUP, min=entry_id, max=entry_id, count=1)
+        deliveries = pending[0]['times_delivered'] if pending else 0
+        if deliveries < settings.INGEST_FLUSH_MAX_DELIVERIES:
+            logger.warning(f"Failed to flush stream entry {entry_id.decode()} (delivery {deliveries}), will retry: {str(exc)}")
+            continue
+        logger.error(f"Moving stream entry {entry_id.decode()} to {settings.INGEST_DEAD_LETTER_KEY} after {deliveries} deliveries: {str(exc)}")
+        pipeline = client.pipeline(transaction=True)
+        pipeline.xadd(settings.INGEST_DEAD_LETTER_KEY, {**fields, b'entry_id': entry_id, b'error': str(exc)[:1000]})
+        pipeline.xack(settings.INGEST_STREAM_KEY, settings.INGEST_STREAM_GROUP, entry_id)
+        pipeline.execute()
+
+def flush_entries(entries):
+    """
+    Creates Logs for a chunk of stream entries (one bulk insert per account) and acknowledges them.
+    A failing account group is retried entry by entry, so one bad entry never holds back the rest
+    (see _fail_entries). Raises if the database is unreachable; unacknowledged entries then
+    stay pending and are retried without counting against them.
+    """
+    by_account, failures, trimmed = {}, [], []
+    for entry_id, fields in entries:
+        if not fields:
+            # Trimmed from the stream before it was flushed
+            trimmed.append(entry_id)
+            continue
+        try:
+            account_id, event = _parse(fields)
+        except (KeyError, ValueError) as e:
+            failures.append((entry_id, fields, e))
+            continue
+        by_account.setdefault(account_id, []).append((entry_id, fields, event))
+    _ack(trimmed)
+
+    flushed = 0
+    for account_id, account_entries in by_account.items():
+        try:
+            flushed += _flush_events(account_id, [event for _, _, event in account_entries])
+            _ack([entry_id for entry_id, _, _ in account_entries])
+            continue
+        except (OperationalError, InterfaceError):
+            raise
+        except Exception as e:
+            if len(account_entries) == 1:
+                failures.append((account_entries[0][0], account_entries[0][1], e))
+                continue
+        for entry_id, fields, event in account_entries:
+            try:
+                flushed += _flush_events(account_id, [event])
+                _ack([entry_id])
+            except (OperationalError, InterfaceError):
+                raise
+            except Exception as e:
+                failures.append((entry_id, fields, e))
+    _fail_entries(failures)
+    return flushed
+
+def stream_stats():
+    """
+    Lag metrics for the flusher group: stream length, entries not yet read by the
+    group (lag, Redis 7+) and entries read but not yet acknowledged (pending).
+    """
+    client = get_redis()
+    stats = {'length': client.xlen(settings.INGEST_STREAM_KEY), 'lag': None, 'pending': 0, 'consumers': 0, 'last_delivered_id': None}
+    for group in client.xinfo_groups(settings.INGEST_STREAM_KEY):
+        if group['name'].decode() == settings.INGEST_STREAM_GROUP:
+            stats.update(
+                lag=group.get('lag'),
+                pending=group['pending'],
+                consumers=group['consumers'],
+                last_delivered_id=group['last-delivered-id'].decode()
+            )
+    return stats
@@ -0,0 +1,64 @@
+# destinations/management/commands/bench_ingest.py
+import json
+import time
+import uuid
+import asyncio
+import httpx
+from django.core.management.base import BaseCommand
+
+class Command(BaseCommand):
+    help = (
+        "Fires the same ingest load at a WSGI deployment of /server/incoming_data/ and an ASGI deployment "
+        "of /server/incoming_data/async/ and prints throughput and latency side by side. Start both servers "
+        "first, e.g. `gunicorn data_manager.wsgi -b :8000` and `uvicorn data_manager.asgi:application --port 8001`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi-url', default='http://127.0.0.1:8000/server/incoming_data/', help='Sync handler on the WSGI server; empty to skip')
+        parser.add_argument('--asgi-url', default='http://127.0.0.1:8001/server/incoming_data/async/', help='Async handler on the ASGI server; empty to skip')
+        parser.add_argument('--auth-token', required=True, help='User API token (Authorization: Token ...)')
+        parser.add_argument('--app-token', required=True, help='Account app_secret_token (CL-X-TOKEN)')
+        parser.add_argument('--requests', type=int, default=10000, help='Requests per server')
+        parser.add_argument('--concurrency', type=int, default=1000, help='Concurrent open connections / in-flight requests')
+        parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds')
+
+    async def _run(self, url, headers, body, options):
+        # One event loop holds every connection open at once, unlike a thread per request
+        concurrency = options['concurrency']
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        remaining = iter(range(options['requests']))
+        results = []
+
+        async def worker(client):
+            for _ in remaining:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(url, content=body, headers={**headers, 'CL-X-EVENT-ID': str(uuid.uuid4())})
+                    ok = 200 <= response.status_code < 300
+                except httpx.HTTPError:
+                    ok = False
+                results.append((ok, (time.perf_counter() - started) * 1000))
+
+        async with httpx.AsyncClient(limits=limits, timeout=options['timeout']) as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+            return results, time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        headers = {
+            'Content-Type': 'application/json',
+            'Authorization': f"Token {options['auth_token']}",
+            'CL-X-TOKEN': options['app_token'],
+        }
+        body = json.dumps({"key": "value", "items": list(range(50))}).encode()
+
+        self.stdout.write(f"{'server':<8}{'ok':>8}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}  url")
+        for name, url in (('wsgi', options['wsgi_url']), ('asgi', options['asgi_url'])):
+            if not url:
+                continue
+            results, elapsed = asyncio.run(self._run(url, headers, body, options))
+            latencies = sorted(latency for _, latency in results)
+            ok = sum(1 for success, _ in results if success)
+            p50 = latencies[len(latencies) // 2]
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            self.stdout.write(f"{name:<8}{ok:>8}{len(results) - ok:>8}{len(results) / elapsed:>10.1f}{p50:>10.1f}{p99:>10.1f}  {url}")
@@ -0,0 +1,53 @@
+# destinations/management/commands/bench_json.py
+import io
+import json
+import timeit
+import uuid
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from destinations.parsers import ORJSONParser
+from destinations.renderers import ORJSONRenderer
+
+class Command(BaseCommand):
+    help = "Microbenchmark of the stdlib-json DRF parser/renderer against the orjson classes on ingest- and LogListView-shaped payloads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help='Logs per rendered page')
+        parser.add_argument('--payload-kb', type=int, default=5, help='Approximate size of each received_data')
+        parser.add_argument('--number', type=int, default=200, help='Iterations per measurement')
+
+    def _event(self, payload_kb):
+        item = {"sku": "A-1029", "qty": 3, "price": 19.99, "tags": ["promo", "summer"], "note": "café ✓"}
+        items = [dict(item, line=i) for i in range(max(1, payload_kb * 1024 // 110))]
+        return {"order_id": str(uuid.uuid4()), "customer": {"id": 4711, "email": "user@example.com"}, "items": items}
+
+    def handle(self, *args, **options):
+        number = options['number']
+        event = self._event(options['payload_kb'])
+        body = json.dumps(event).encode()
+        now = timezone.now().isoformat()
+        page = [
+            {
+                "event_id": f"{uuid.uuid4()}-{i % 7}",
+                "account": 1,
+                "destination": i % 7,
+                "received_timestamp": now,
+                "processed_timestamp": now,
+                "received_data": event,
+                "status": "success",
+            }
+            for i in range(options['rows'])
+        ]
+
+        cases = [
+            ("parse ingest body", lambda: JSONParser().parse(io.BytesIO(body)), lambda: ORJSONParser().parse(io.BytesIO(body), parser_context={})),
+            ("render log page", lambda: JSONRenderer().render(page), lambda: ORJSONRenderer().render(page)),
+        ]
+        self.stdout.write(f"body {len(body) / 1024:.1f} KB, page {len(JSONRenderer().render(page)) / 1024:.1f} KB, {number} iterations")
+        self.stdout.write(f"{'case':<20}{'stdlib ms':>12}{'orjson ms':>12}{'speedup':>10}")
+        for name, stdlib_fn, orjson_fn in cases:
+            stdlib_ms = timeit.timeit(stdlib_fn, number=number) * 1000 / number
+            orjson_ms = timeit.timeit(orjson_fn, number=number) * 1000 / number
+            self.stdout.write(f"{name:<20}{stdlib_ms:>12.3f}{orjson_ms:>12.3f}{stdlib_ms / orjson_ms:>9.1f}x")
@@ -0,0 +1,61 @@
+# destinations/management/commands/flush_ingest_stream.py
+import json
+import os
+import socket
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from destinations.ingest_stream import ensure_group, read_entries, claim_stalled_entries, flush_entries, stream_stats
+
+class Command(BaseCommand):
+    help = (
+        "Drains the write-behind ingest stream (INGEST_WRITE_BEHIND=True): bulk-creates Logs and enqueues delivery. "
+        "Offsets are tracked by a Redis consumer group, so a restarted or crashed flusher resumes without loss."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consumer', default=f"{socket.gethostname()}-{os.getpid()}", help='Consumer name within the group')
+        parser.add_argument('--batch-size', type=int, default=settings.INGEST_FLUSH_BATCH_SIZE)
+        parser.add_argument('--block-ms', type=int, default=1000, help='How long to wait for new entries')
+        parser.add_argument('--min-idle-ms', type=int, default=60000, help='Claim entries unacknowledged by other consumers for this long')
+        parser.add_argument('--stats-interval', type=int, default=30, help='Seconds between lag metric log lines')
+        parser.add_argument('--stats', action='store_true', help='Print lag metrics and exit')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(json.dumps(stream_stats()))
+            return
+
+        ensure_group()
+        consumer, batch_size = options['consumer'], options['batch_size']
+
+        # Anything this consumer read before a crash comes first. Entries that fail again stay
+        # pending and are picked up below by claim_stalled_entries once --min-idle-ms has passed.
+        last_id = '0'
+        while True:
+            try:
+                entries = read_entries(consumer, batch_size, pending_after=last_id)
+                if not entries:
+                    break
+                flush_entries(entries)
+                last_id = entries[-1][0]
+            except Exception as e:
+                self.stderr.write(f"Flushing previously read entries failed, leaving them to be reclaimed: {str(e)}")
+                break
+
+        last_stats = time.monotonic()
+        while True:
+            try:
+                entries = claim_stalled_entries(consumer, options['min_idle_ms'], batch_size)
+                entries += read_entries(consumer, batch_size, block_ms=options['block_ms'])
+                if entries:
+                    flushed = flush_entries(entries)
+                    self.stdout.write(f"Flushed {flushed} events from {len(entries)} stream entries")
+            except Exception as e:
+                # Unacknowledged entries stay pending and are claimed again after --min-idle-ms
+                self.stderr.write(f"Flush failed, retrying: {str(e)}")
+                time.sleep(1)
+
+            if time.monotonic() - last_stats >= options['stats_interval']:
+                self.stdout.write(f"Ingest stream stats: {json.dumps(stream_stats())}")
+                last_stats = time.monotonic()
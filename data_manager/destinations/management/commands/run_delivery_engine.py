@@ -0,0 +1,39 @@
+# destinations/management/commands/run_delivery_engine.py
+import asyncio
+import signal
+from django.core.management.base import BaseCommand
+from destinations.delivery_engine import DeliveryEngine
+
+class Command(BaseCommand):
+    help = (
+        "Runs the asyncio delivery engine, which keeps thousands of deliveries in flight per process. "
+        "Set DELIVERY_BACKEND = 'engine' so ingest leaves logs pending for it instead of enqueueing Celery tasks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Pending logs claimed per query')
+        parser.add_argument('--max-in-flight', type=int, default=1000, help='Concurrent requests per process')
+        parser.add_argument('--per-destination', type=int, default=50, help='Concurrent requests per destination')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when nothing is pending')
+        parser.add_argument('--flush-interval', type=float, default=0.5, help='Seconds between result write-backs')
+        parser.add_argument('--lease-seconds', type=int, default=600, help='Claims older than this are returned to pending')
+
+    def handle(self, *args, **options):
+        engine = DeliveryEngine(
+            batch_size=options['batch_size'],
+            max_in_flight=options['max_in_flight'],
+            per_destination=options['per_destination'],
+            poll_interval=options['poll_interval'],
+            flush_interval=options['flush_interval'],
+            lease_seconds=options['lease_seconds'],
+        )
+
+        async def main():
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, engine.stop)
+            await engine.run()
+
+        self.stdout.write("Delivery engine started")
+        asyncio.run(main())
+        self.stdout.write("Delivery engine stopped")
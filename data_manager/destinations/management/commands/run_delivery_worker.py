@@ -0,0 +1,36 @@
+# destinations/management/commands/run_delivery_worker.py
+from django.core.management.base import BaseCommand
+from accounts.models import Account
+from data_manager.celery import app
+from destinations.queues import priority_queues
+
+class Command(BaseCommand):
+    help = (
+        "Starts a Celery worker for one delivery priority. It consumes every shard queue of that "
+        "priority round-robin with prefetch 1, so a backlog in one shard cannot starve the others. "
+        "Run at least one worker per priority, and one with --include-default for beat tasks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--priority', choices=[priority for priority, _ in Account.PRIORITIES], default='normal')
+        parser.add_argument('--concurrency', type=int, default=8, help='Worker processes')
+        parser.add_argument('--include-default', action='store_true', help='Also consume the default queue (retry dispatch, pool stats)')
+        parser.add_argument('--dry-run', action='store_true', help='Print the celery command instead of starting the worker')
+
+    def handle(self, *args, **options):
+        priority = options['priority']
+        queues = priority_queues(priority)
+        if options['include_default']:
+            queues.append(app.conf.task_default_queue)
+        argv = [
+            'worker',
+            '--queues', ','.join(queues),
+            '--hostname', f"delivery-{priority}@%h",
+            '--concurrency', str(options['concurrency']),
+            '--prefetch-multiplier', '1',
+            '-O', 'fair',
+        ]
+        if options['dry_run']:
+            self.stdout.write(f"celery -A data_manager {' '.join(argv)}")
+            return
+        app.worker_main(argv)
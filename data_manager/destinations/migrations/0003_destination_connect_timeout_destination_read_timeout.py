@@ -0,0 +1,24 @@
+# Generated by Django 5.1.6 on 2026-10-17 10:04
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destinations', '0002_payload_log_payload_alter_log_received_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='destination',
+            name='connect_timeout',
+            field=models.FloatField(default=3.05, validators=[django.core.validators.MinValueValidator(0.1), django.core.validators.MaxValueValidator(60)]),
+        ),
+        migrations.AddField(
+            model_name='destination',
+            name='read_timeout',
+            field=models.FloatField(default=10, validators=[django.core.validators.MinValueValidator(0.1), django.core.validators.MaxValueValidator(300)]),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.6 on 2026-10-17 10:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destinations', '0003_destination_connect_timeout_destination_read_timeout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='log',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='log',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('success', 'Success'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['status', 'id'], name='destination_status_997309_idx'),
+        ),
+    ]
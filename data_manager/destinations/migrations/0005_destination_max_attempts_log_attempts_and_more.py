@@ -0,0 +1,38 @@
+# Generated by Django 5.1.6 on 2026-10-17 11:26
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destinations', '0004_log_claimed_at_alter_log_status_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='destination',
+            name='max_attempts',
+            field=models.PositiveSmallIntegerField(default=5, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(50)]),
+        ),
+        migrations.AddField(
+            model_name='log',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='log',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='log',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('retrying', 'Retrying'), ('success', 'Success'), ('failed', 'Failed'), ('dead', 'Dead')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='destination_status_98e272_idx'),
+        ),
+    ]
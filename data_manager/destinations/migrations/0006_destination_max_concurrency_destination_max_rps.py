@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-17 12:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destinations', '0005_destination_max_attempts_log_attempts_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='destination',
+            name='max_concurrency',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='destination',
+            name='max_rps',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.6 on 2026-10-17 12:40
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destinations', '0006_destination_max_concurrency_destination_max_rps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='destination',
+            name='batch_linger_ms',
+            field=models.PositiveIntegerField(default=1000, validators=[django.core.validators.MaxValueValidator(60000)]),
+        ),
+        migrations.AddField(
+            model_name='destination',
+            name='batch_max_size',
+            field=models.PositiveIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(1000)]),
+        ),
+    ]
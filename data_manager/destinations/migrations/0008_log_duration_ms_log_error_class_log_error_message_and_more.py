@@ -0,0 +1,38 @@
+# Generated by Django 5.1.6 on 2026-10-17 13:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destinations', '0007_destination_batch_linger_ms_destination_batch_max_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='log',
+            name='duration_ms',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='log',
+            name='error_class',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='log',
+            name='error_message',
+            field=models.CharField(blank=True, default='', max_length=1000),
+        ),
+        migrations.AddField(
+            model_name='log',
+            name='response_bytes',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='log',
+            name='response_status',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
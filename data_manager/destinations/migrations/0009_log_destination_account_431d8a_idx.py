@@ -0,0 +1,17 @@
+# Generated by Django 5.1.6 on 2026-10-17 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destinations', '0008_log_duration_ms_log_error_class_log_error_message_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['account', '-received_timestamp', '-id'], name='destination_account_431d8a_idx'),
+        ),
+    ]
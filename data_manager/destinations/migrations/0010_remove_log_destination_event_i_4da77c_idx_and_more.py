@@ -0,0 +1,37 @@
+# Generated by Django 5.1.6 on 2026-10-17 14:50
+
+from django.db import migrations
+
+TRGM_INDEX = 'destinations_log_event_id_trgm'
+
+
+def create_trigram_index(apps, schema_editor):
+    # Backs event_id__icontains, which PostgreSQL compiles to UPPER("event_id"::text) LIKE UPPER(...)
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {TRGM_INDEX} ON destinations_log '
+        'USING gin (UPPER("event_id"::text) gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {TRGM_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destinations', '0009_log_destination_account_431d8a_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='log',
+            name='destination_event_i_4da77c_idx',
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
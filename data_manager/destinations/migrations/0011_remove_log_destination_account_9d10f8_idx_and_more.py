@@ -0,0 +1,26 @@
+# Generated by Django 5.1.6 on 2026-10-17 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_account_priority'),
+        ('destinations', '0010_remove_log_destination_event_i_4da77c_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='log',
+            name='destination_account_9d10f8_idx',
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['account', 'destination', '-received_timestamp', '-id'], name='destination_account_fcc0ef_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(condition=models.Q(('status', 'pending'), ('status', 'processing'), ('status', 'retrying'), ('status', 'failed'), ('status', 'dead'), _connector='OR'), fields=['account', 'status', '-received_timestamp', '-id'], name='destinations_log_open_idx'),
+        ),
+    ]
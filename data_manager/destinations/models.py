@@ -1,10 +1,13 @@
 # destinations/models.py
 from django.db import models
+from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from users.models import CustomUser
 from accounts.models import Account
-from django.db.models.signals import post_delete
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from data_manager.cache_namespace import bump
 
 class Destination(models.Model):
     HTTP_METHODS = (
@@ -16,6 +19,13 @@ class Destination(models.Model):
     url = models.URLField(max_length=2000, db_index=True)
     http_method = models.CharField(max_length=10, choices=HTTP_METHODS)
     headers = models.JSONField(default=dict, blank=False)
+    connect_timeout = models.FloatField(default=3.05, validators=[MinValueValidator(0.1), MaxValueValidator(60)])
+    read_timeout = models.FloatField(default=10, validators=[MinValueValidator(0.1), MaxValueValidator(300)])
+    max_attempts = models.PositiveSmallIntegerField(default=5, validators=[MinValueValidator(1), MaxValueValidator(50)])
+    max_rps = models.PositiveIntegerField(null=True, blank=True)  # None means unlimited
+    max_concurrency = models.PositiveIntegerField(null=True, blank=True)  # None means unlimited
+    batch_max_size = models.PositiveIntegerField(default=1, validators=[MinValueValidator(1), MaxValueValidator(1000)])  # 1 disables batching
+    batch_linger_ms = models.PositiveIntegerField(default=1000, validators=[MaxValueValidator(60000)])
     account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='destinations', db_index=True)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
@@ -31,24 +41,85 @@ class Destination(models.Model):
     def __str__(self):
         return f"{self.url} ({self.http_method}) - {self.account.name}"
 
+class Payload(models.Model):
+    # Event bodies stored once and shared by every Log of the fan-out, keyed by content hash
+    digest = models.CharField(max_length=64, unique=True)
+    data = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.digest
+
+# Statuses of logs still being worked on or needing attention
+OPEN_STATUSES = ['pending', 'processing', 'retrying', 'failed', 'dead']
+
 class Log(models.Model):
     event_id = models.CharField(max_length=100, unique=True)
     account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='logs')
     destination = models.ForeignKey(Destination, on_delete=models.CASCADE, related_name='logs')
     received_timestamp = models.DateTimeField(default=timezone.now)
     processed_timestamp = models.DateTimeField(null=True, blank=True)
-    received_data = models.JSONField()
-    status = models.CharField(max_length=20, choices=(('pending', 'Pending'), ('success', 'Success'), ('failed', 'Failed')), default='pending')
+    payload = models.ForeignKey(Payload, on_delete=models.PROTECT, null=True, blank=True, related_name='logs')
+    received_data = models.JSONField(null=True, blank=True)  # Only set on logs written before Payload existed
+    status = models.CharField(max_length=20, choices=(
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('retrying', 'Retrying'),
+        ('success', 'Success'),
+        ('failed', 'Failed'),
+        ('dead', 'Dead'),
+    ), default='pending')
+    claimed_at = models.DateTimeField(null=True, blank=True)  # Set while the delivery engine holds the log
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)  # When a 'retrying' log is due again
+    # Outcome of the latest delivery attempt
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)  # None when no response was received
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+    response_bytes = models.PositiveIntegerField(null=True, blank=True)
+    error_class = models.CharField(max_length=100, blank=True, default='')
+    error_message = models.CharField(max_length=1000, blank=True, default='')
 
     class Meta:
+        # LogListView access paths, all scoped to an account and ordered by (-received_timestamp, -id);
+        # status='success' is the bulk of the table and walks the plain account index
         indexes = [
-            models.Index(fields=['event_id']),
-            models.Index(fields=['account', 'status']),
+            models.Index(fields=['status', 'id']),
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['account', '-received_timestamp', '-id']),
+            models.Index(fields=['account', 'destination', '-received_timestamp', '-id']),
+            models.Index(
+                fields=['account', 'status', '-received_timestamp', '-id'],
+                # OR of equalities rather than IN, so SQLite can match it against status='failed' etc.
+                condition=models.Q(*[('status', status) for status in OPEN_STATUSES], _connector=models.Q.OR),
+                name='destinations_log_open_idx'
+            ),
         ]
 
     def __str__(self):
         return f"Event {self.event_id} - {self.status}"
 
+    @property
+    def payload_data(self):
+        return self.payload.data if self.payload_id else self.received_data
+
 @receiver(post_delete, sender=Account)
 def delete_account_destinations(sender, instance, **kwargs):
-    instance.destinations.all().delete()
\ No newline at end of file
+    instance.destinations.all().delete()
+
+@receiver(post_save, sender=Account)
+def invalidate_account_routing(sender, instance, **kwargs):
+    # The routing table carries the account's delivery priority
+    from .routing import invalidate_routing_table
+    account_id = instance.id
+    transaction.on_commit(lambda: invalidate_routing_table(account_id))
+
+@receiver(post_save, sender=Destination)
+@receiver(post_delete, sender=Destination)
+def invalidate_destination_caches(sender, instance, **kwargs):
+    from .routing import invalidate_routing_table
+    account_id = instance.account_id
+
+    def invalidate():
+        invalidate_routing_table(account_id)
+        bump('destinations', account_id)
+    transaction.on_commit(invalidate)
@@ -0,0 +1,98 @@
+# destinations/pagination.py
+import base64
+import orjson
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over the queryset's (field, id) ordering, e.g. filter_logs' default
+    (-received_timestamp, -id). The cursor holds the last row's (field, id), so every page
+    is one index range scan of page_size + 1 rows: no OFFSET, no COUNT(*), and rows
+    inserted meanwhile never shift or repeat entries. Forward-only. A nullable field must
+    be ordered with NULLs last (see filter_logs); the cursor then carries a null value.
+    """
+    page_size = settings.LOG_PAGE_SIZE
+    max_page_size = settings.LOG_PAGE_SIZE_MAX
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.next_cursor = None
+        field, _ = self.get_ordering(queryset)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = self.after(queryset, *self.decode_cursor(cursor, queryset.model._meta.get_field(field)))
+
+        page_size = self.get_page_size(request)
+        results = list(queryset[:page_size + 1])
+        if len(results) > page_size:
+            results = results[:page_size]
+            last = results[-1]
+            self.next_cursor = self.encode_cursor(getattr(last, field), last.id)
+        return results
+
+    def get_ordering(self, queryset):
+        # (field, descending) of the leading order_by entry: a name ('-field') or an F() ordering
+        ordering = queryset.query.order_by[0]
+        if isinstance(ordering, str):
+            return ordering.lstrip('-'), ordering.startswith('-')
+        return ordering.expression.name, ordering.descending
+
+    def after(self, queryset, value, pk):
+        # Rows following (value, pk) in the queryset's (field, id) order, NULL values last
+        field, descending = self.get_ordering(queryset)
+        lookup = 'lt' if descending else 'gt'
+        if value is None:
+            return queryset.filter(**{f"{field}__isnull": True, f"id__{lookup}": pk})
+        # The redundant inclusive bound gives the planner an index range despite the OR
+        following = Q(**{f"{field}__{lookup}e": value}) & (Q(**{f"{field}__{lookup}": value}) | Q(**{f"id__{lookup}": pk}))
+        if queryset.model._meta.get_field(field).null:
+            following |= Q(**{f"{field}__isnull": True})
+        return queryset.filter(following)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def encode_cursor(self, value, pk):
+        token = orjson.dumps([value, pk])
+        return base64.urlsafe_b64encode(token).decode('ascii')
+
+    def decode_cursor(self, cursor, model_field):
+        try:
+            value, pk = orjson.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            if value is None and not model_field.null:
+                raise ValueError(value)
+            return model_field.to_python(value), int(pk)
+        except (ValueError, TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,36 @@
+# destinations/payloads.py
+import hashlib
+import json
+from django.db import connection
+from .models import Payload
+
+def payload_digest(data):
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def _new_payloads(datas):
+    digests = [payload_digest(data) for data in datas]
+    unique = {digest: data for digest, data in zip(digests, datas)}
+    return digests, [Payload(digest=digest, data=data) for digest, data in unique.items()]
+
+def _lock_suffix():
+    # FOR KEY SHARE makes a concurrent DELETE (the retention purge) wait for this transaction
+    # without blocking other ingests that reuse the same body; SQLite serializes writers anyway
+    return {'postgresql': ' FOR KEY SHARE', 'mysql': ' FOR SHARE'}.get(connection.vendor, '')
+
+def store_payloads(datas):
+    """
+    Stores each distinct body once and returns the Payload ids aligned with datas.
+    Bodies already stored (by an earlier event or a concurrent request) are reused, and their
+    rows stay locked until the caller's transaction commits the logs pointing at them.
+    """
+    digests, payloads = _new_payloads(datas)
+    Payload.objects.bulk_create(payloads, ignore_conflicts=True)
+    unique = list(set(digests))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT digest, id FROM {Payload._meta.db_table} WHERE digest IN ({', '.join(['%s'] * len(unique))}){_lock_suffix()}",
+            unique
+        )
+        ids = dict(cursor.fetchall())
+    return [ids[digest] for digest in digests]
@@ -0,0 +1,13 @@
+# destinations/queues.py
+from django.conf import settings
+
+def delivery_queue(account_id, priority):
+    """
+    Celery queue for an account's deliveries. Accounts are spread over DELIVERY_QUEUE_SHARDS
+    queues per priority and workers consume a priority's shards round-robin, so one account's
+    backlog only delays the accounts that share its shard.
+    """
+    return f"delivery.{priority}.{account_id % settings.DELIVERY_QUEUE_SHARDS}"
+
+def priority_queues(priority):
+    return [f"delivery.{priority}.{shard}" for shard in range(settings.DELIVERY_QUEUE_SHARDS)]
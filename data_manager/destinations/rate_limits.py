@@ -0,0 +1,63 @@
+# destinations/rate_limits.py
+import logging
+import redis
+from data_manager.redis_client import get_redis
+from .token_bucket import consume
+
+logger = logging.getLogger(__name__)
+
+# Distributed semaphore: a sorted set of lease tokens scored by expiry, so slots held by a
+# crashed worker free themselves once the lease runs out.
+ACQUIRE_LUA = """
+local limit = tonumber(ARGV[1])
+local lease_ms = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) < limit then
+    redis.call('ZADD', KEYS[1], now + lease_ms, ARGV[3])
+    redis.call('PEXPIRE', KEYS[1], lease_ms)
+    return 1
+end
+return 0
+"""
+
+# How long to defer a delivery that found every concurrency slot taken (seconds)
+CONCURRENCY_RETRY_AFTER = 1
+
+_scripts = {}
+
+def _acquire_script():
+    client = get_redis()
+    script = _scripts.get(id(client))
+    if script is None:
+        script = _scripts[id(client)] = client.register_script(ACQUIRE_LUA)
+    return script
+
+def acquire(destination, token):
+    """
+    Reserves a delivery slot under the destination's max_concurrency and max_rps, shared
+    by all workers. Returns (allowed, retry_after_seconds); an allowed slot must be given
+    back with release(). Destinations without limits, or an unreachable Redis, always allow.
+    """
+    try:
+        if destination.max_concurrency:
+            lease_ms = int((destination.connect_timeout + destination.read_timeout + 5) * 1000)
+            if not _acquire_script()(keys=[f"dest_concurrency:{destination.id}"], args=[destination.max_concurrency, lease_ms, token]):
+                return False, CONCURRENCY_RETRY_AFTER
+        if destination.max_rps:
+            allowed, retry_after = consume(f"dest_rps:{destination.id}", destination.max_rps, destination.max_rps)
+            if not allowed:
+                release(destination, token)
+                return False, retry_after
+    except redis.RedisError as e:
+        logger.warning(f"Destination limiter unavailable, allowing delivery: {str(e)}")
+    return True, 0
+
+def release(destination, token):
+    if not destination.max_concurrency:
+        return
+    try:
+        get_redis().zrem(f"dest_concurrency:{destination.id}", token)
+    except redis.RedisError as e:
+        logger.warning(f"Failed to release concurrency slot for destination {destination.id}: {str(e)}")
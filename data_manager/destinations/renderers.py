@@ -0,0 +1,102 @@
+# destinations/renderers.py
+import io
+import csv
+import json
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+_drf_encoder = JSONEncoder()
+
+def _default(obj):
+    # Types orjson does not handle natively (Decimal, lazy strings, ...) and datetimes,
+    # which are passed through so they render exactly as DRF's encoder formats them
+    return _drf_encoder.default(obj)
+
+def _dumps(data, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME):
+    try:
+        return orjson.dumps(data, default=_default, option=option)
+    except orjson.JSONEncodeError:
+        # orjson refuses integers wider than 64 bits; the stdlib encoder handles them exactly
+        return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Drop-in replacement for rest_framework.renderers.JSONRenderer backed by orjson.
+    Indented output (browsable API, ?indent) still goes through the stdlib renderer.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type or '', renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        return _dumps(data)
+
+
+class StreamingRowRenderer(BaseRenderer):
+    """
+    Renders a list of flat dicts; stream() renders an iterable of them in chunks of
+    chunk_rows rows for StreamingHttpResponse. The header (column order) defaults to
+    the first row's keys.
+    """
+    chunk_rows = 1000
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return b''.join(self.stream(data if isinstance(data, list) else [data]))
+
+    def stream(self, rows, header=None):
+        chunk = []
+        if header is not None:
+            yield self.render_header(header)
+        for row in rows:
+            if header is None:
+                header = list(row)
+                yield self.render_header(header)
+            chunk.append(row)
+            if len(chunk) >= self.chunk_rows:
+                yield self.render_rows(chunk, header)
+                chunk = []
+        if chunk:
+            yield self.render_rows(chunk, header)
+
+    def render_header(self, header):
+        return b''
+
+    def render_rows(self, rows, header):
+        raise NotImplementedError
+
+class NDJSONRenderer(StreamingRowRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render_rows(self, rows, header):
+        return b''.join(_dumps(row) + b'\n' for row in rows)
+
+class CSVRenderer(StreamingRowRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render_header(self, header):
+        return self._write([header])
+
+    def render_rows(self, rows, header):
+        return self._write([[self._cell(row.get(column)) for column in header] for row in rows])
+
+    def _cell(self, value):
+        if value is None:
+            return ''
+        if isinstance(value, (dict, list)):
+            return _dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+        if isinstance(value, (str, int, float)):
+            return value
+        return _default(value)
+
+    def _write(self, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode(self.charset)
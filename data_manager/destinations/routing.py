@@ -0,0 +1,73 @@
+# destinations/routing.py
+import logging
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from data_manager.lru import LocalLRUCache
+from data_manager.cache_namespace import get_generation, aget_generation, bump
+from accounts.models import Account
+from .models import Destination
+
+logger = logging.getLogger(__name__)
+
+_local_tables = LocalLRUCache(
+    maxsize=settings.ROUTING_TABLE_LOCAL_SIZE,
+    timeout=settings.ROUTING_TABLE_LOCAL_TIMEOUT
+)
+
+def _table_key(account_id, version):
+    return f"routing_table_{account_id}_{version}"
+
+def merged_headers(headers):
+    return {**settings.DESTINATION_DEFAULT_HEADERS, **(headers or {})}
+
+def build_routing_table(account_id, version):
+    routes = [
+        {
+            'id': destination['id'],
+            'http_method': destination['http_method'],
+            'url': destination['url'],
+            'headers': merged_headers(destination['headers']),
+        }
+        for destination in Destination.objects.filter(account_id=account_id).order_by('id').values('id', 'http_method', 'url', 'headers')
+    ]
+    priority = Account.objects.filter(id=account_id).values_list('priority', flat=True).first()
+    return {'account_id': account_id, 'version': version, 'priority': priority or 'normal', 'routes': routes}
+
+def get_routing_table(account_id):
+    """
+    Returns the account's routing table: {'account_id', 'version', 'priority', 'routes': [...]}.
+    Steady state costs one Redis GET for the version stamp and no database queries;
+    the table itself is rebuilt only after invalidate_routing_table bumps the 'routing' generation.
+    """
+    version = get_generation('routing', account_id)
+    table = _local_tables.get(account_id)
+    if table is not None and table['version'] == version:
+        return table
+
+    table = cache.get(_table_key(account_id, version))
+    if table is None:
+        table = build_routing_table(account_id, version)
+        cache.set(_table_key(account_id, version), table, timeout=settings.ROUTING_TABLE_TIMEOUT)
+    _local_tables.set(account_id, table)
+    return table
+
+async def aget_routing_table(account_id):
+    """
+    Async counterpart of get_routing_table for ASGI views.
+    """
+    version = await aget_generation('routing', account_id)
+    table = _local_tables.get(account_id)
+    if table is not None and table['version'] == version:
+        return table
+
+    table = await cache.aget(_table_key(account_id, version))
+    if table is None:
+        table = await sync_to_async(build_routing_table)(account_id, version)
+        await cache.aset(_table_key(account_id, version), table, timeout=settings.ROUTING_TABLE_TIMEOUT)
+    _local_tables.set(account_id, table)
+    return table
+
+def invalidate_routing_table(account_id):
+    bump('routing', account_id)
+    _local_tables.delete(account_id)
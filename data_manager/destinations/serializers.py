@@ -10,7 +10,7 @@ class DestinationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Destination
-        fields = ['id', 'url', 'http_method', 'headers', 'account', 'created_at', 'updated_at', 'created_by', 'updated_by']
+        fields = ['id', 'url', 'http_method', 'headers', 'connect_timeout', 'read_timeout', 'max_attempts', 'max_rps', 'max_concurrency', 'batch_max_size', 'batch_linger_ms', 'account', 'created_at', 'updated_at', 'created_by', 'updated_by']
         extra_kwargs = {
             'id': {'read_only': True},
             'created_at': {'read_only': True},
@@ -25,13 +25,41 @@ class DestinationSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Headers must be a non-empty dictionary")
         return value
 
+    def validate(self, attrs):
+        http_method = attrs.get('http_method', getattr(self.instance, 'http_method', None))
+        batch_max_size = attrs.get('batch_max_size', getattr(self.instance, 'batch_max_size', 1))
+        if batch_max_size > 1 and http_method not in ('POST', 'PUT'):
+            raise serializers.ValidationError({'batch_max_size': "Batching requires a POST or PUT destination"})
+        return attrs
+
 class LogSerializer(serializers.ModelSerializer):
+    received_data = serializers.JSONField(source='payload_data', read_only=True)
+
     class Meta:
         model = Log
-        fields = ['event_id', 'account', 'destination', 'received_timestamp', 'processed_timestamp', 'received_data', 'status']
+        fields = ['event_id', 'account', 'destination', 'received_timestamp', 'processed_timestamp', 'received_data', 'status', 'attempts', 'next_attempt_at', 'response_status', 'duration_ms', 'response_bytes', 'error_class', 'error_message']
         extra_kwargs = {
             'account': {'read_only': True},
             'destination': {'read_only': True},
             'received_timestamp': {'read_only': True},
-            'processed_timestamp': {'read_only': True}
-        }
\ No newline at end of file
+            'processed_timestamp': {'read_only': True},
+            'attempts': {'read_only': True},
+            'next_attempt_at': {'read_only': True},
+            'response_status': {'read_only': True},
+            'duration_ms': {'read_only': True},
+            'response_bytes': {'read_only': True},
+            'error_class': {'read_only': True},
+            'error_message': {'read_only': True}
+        }
+
+# Client event ids are stored as '<event_id>-<destination_id>' in Log.event_id (max_length=100)
+EVENT_ID_MAX_LENGTH = 64
+
+class BatchEventSerializer(serializers.Serializer):
+    event_id = serializers.CharField(max_length=EVENT_ID_MAX_LENGTH, required=False)
+    data = serializers.DictField()
+
+    def validate_data(self, value):
+        if not value:
+            raise serializers.ValidationError("Invalid Data")
+        return value
@@ -1,28 +1,223 @@
 # destinations/tasks.py
 from celery import shared_task
-import requests
+from django.conf import settings
+from django.db import transaction, IntegrityError
+from datetime import timedelta
+from django.db.models import ProtectedError
 from django.utils import timezone
-from .models import Log
+from accounts.models import Account
+from .models import Destination, Log, Payload
+from data_manager.redis_client import get_redis
+from data_manager.cache_namespace import bump
+from .delivery import deliver_logs, claim_logs, release_stale_claims, requeue_parked, UPDATE_FIELDS
+from .queues import delivery_queue
+from . import http_client
 import logging
 
 logger = logging.getLogger(__name__)
 
 @shared_task
 def send_to_destination(log_id):
-    log = Log.objects.get(id=log_id)
-    destination = log.destination
+    send_to_destination_batch([log_id])
+
+@shared_task
+def send_to_destination_batch(log_ids):
+    # Logs are claimed ('processing' + claimed_at) before delivery, so if this worker dies the stale-claim
+    # sweep in dispatch_due_retries hands them back instead of losing them; one CASE UPDATE writes all outcomes.
+    # Logs no longer pending were already handled, e.g. by the asyncio delivery engine.
+    batching = {}
+    for log in Log.objects.filter(id__in=log_ids, status='pending', destination__batch_max_size__gt=1).select_related('account', 'destination'):
+        # Left pending for the destination's next batch flush
+        batching[log.destination_id] = (log.destination, delivery_queue(log.account_id, log.account.priority))
+    for destination, queue in batching.values():
+        schedule_batch_flush(destination, queue)
+    single = claim_logs(len(log_ids), exclude_destination_ids=list(batching), id__in=log_ids)
+    parked = deliver_logs(single)
+    for log in single:
+        log.claimed_at = None
+    Log.objects.bulk_update(single, UPDATE_FIELDS + ['claimed_at'])
+    bump('logs', *{log.account_id for log in single})
+    schedule_parked(parked)
+
+def schedule_parked(logs, queue=None):
+    """
+    Publishes one dispatch_parked_logs per account for logs deliver_logs parked, timed for
+    when the last of them is due, so they go out again as soon as the limit allows instead
+    of with the next dispatch_due_retries scan (which stays the fallback if this is lost).
+    queue defaults to each log's account queue (log.account must be loaded).
+    """
+    groups = {}
+    for log in logs:
+        log_queue = queue or delivery_queue(log.account_id, log.account.priority)
+        group = groups.setdefault((log.account_id, log_queue), {'ids': [], 'due': log.next_attempt_at})
+        group['ids'].append(log.id)
+        group['due'] = max(group['due'], log.next_attempt_at)
+    now = timezone.now()
+    for (account_id, log_queue), group in groups.items():
+        try:
+            dispatch_parked_logs.apply_async(
+                (group['ids'], account_id, log_queue),
+                countdown=max((group['due'] - now).total_seconds(), 0), queue=log_queue
+            )
+        except Exception as e:
+            logger.warning(f"Failed to schedule parked logs {group['ids']}, leaving them to the retry dispatcher: {str(e)}")
+
+@shared_task
+def dispatch_parked_logs(log_ids, account_id, queue=None):
+    from .fanout import publish_deliveries
+    log_ids = requeue_parked(log_ids)
+    if log_ids:
+        bump('logs', account_id)
+        publish_deliveries(log_ids, queue)
+    return len(log_ids)
+
+def _batch_flush_key(destination_id, immediate=False):
+    return f"batch_flush_now_{destination_id}" if immediate else f"batch_flush_{destination_id}"
+
+def schedule_batch_flush(destination, queue=None, backoff=False):
+    # At most one flush is scheduled per destination and linger window; the marker outlives
+    # the countdown slightly so a lost task only delays the next flush. Once a full batch is
+    # pending there is nothing to wait for and it is flushed right away (deduplicated the same
+    # way), unless the receiver or a limit asked for a pause (backoff).
+    linger_ms = destination.batch_linger_ms
+    pending = Log.objects.filter(destination_id=destination.id, status='pending')[:destination.batch_max_size]
+    immediate = not backoff and pending.count() >= destination.batch_max_size
+    if get_redis().set(_batch_flush_key(destination.id, immediate), 1, nx=True, px=linger_ms + 1000):
+        flush_destination_batch.apply_async((destination.id,), countdown=0 if immediate else linger_ms / 1000, queue=queue)
+
+@shared_task
+def flush_destination_batch(destination_id):
+    """
+    Delivers the pending logs of a batching destination as JSON arrays of up to
+    batch_max_size payloads, one POST per chunk, until fewer than a full chunk is left.
+    A chunk the receiver asks to retry, or one parked by a limit, ends the flush early;
+    the logs still pending then get another flush after the linger window.
+    """
+    # Logs published from now on schedule the next flush
+    get_redis().delete(_batch_flush_key(destination_id), _batch_flush_key(destination_id, immediate=True))
+    destination = Destination.objects.filter(id=destination_id).select_related('account').first()
+    if destination is None:
+        return 0
+    queue = delivery_queue(destination.account_id, destination.account.priority)
+    release_stale_claims(settings.DELIVERY_CLAIM_LEASE, destination_id=destination_id)
+    delivered = 0
+    while True:
+        logs = claim_logs(destination.batch_max_size, destination_id=destination_id)
+        if not logs:
+            break
+        parked = deliver_logs(logs)
+        for log in logs:
+            log.claimed_at = None
+        Log.objects.bulk_update(logs, UPDATE_FIELDS + ['claimed_at'])
+        schedule_parked(parked, queue)
+        delivered += len(logs)
+        if len(logs) < destination.batch_max_size:
+            break
+        # Chunks rejected for good (failed, dead) say nothing about the next one; keep draining
+        # unless the receiver or a limit pushes back, and never strand what is still pending
+        if parked or logs[0].status == 'retrying':
+            if Log.objects.filter(destination_id=destination_id, status='pending').exists():
+                schedule_batch_flush(destination, queue, backoff=True)
+            break
+    if delivered:
+        bump('logs', destination.account_id)
+    return delivered
+
+def _publish_by_queue(log_ids):
+    # Each log goes back to its account's queue; returns (queued, failed) ids
+    from .fanout import publish_deliveries
+    by_queue, account_ids = {}, set()
+    for log_id, account_id, priority in Log.objects.filter(id__in=log_ids).values_list('id', 'account_id', 'account__priority'):
+        by_queue.setdefault(delivery_queue(account_id, priority), []).append(log_id)
+        account_ids.add(account_id)
+    bump('logs', *account_ids)
+    queued, failed = [], []
+    for queue, queue_log_ids in by_queue.items():
+        queue_queued, queue_failed = publish_deliveries(queue_log_ids, queue)
+        queued.extend(queue_queued)
+        failed.extend(queue_failed)
+    return queued, failed
+
+@shared_task
+def dispatch_due_retries():
+    """
+    Periodic (celery beat) scan of the (status, next_attempt_at) index: moves due
+    'retrying' logs back to pending and publishes them. No worker ever sleeps on a retry.
+    It also hands back claims abandoned by a delivery task or batch flush that died, for
+    every destination, and publishes them again (batching destinations' logs get a flush).
+    """
+    released = release_stale_claims(settings.DELIVERY_CLAIM_LEASE)
+    if released:
+        logger.warning(f"Released {len(released)} stale delivery claims")
+        _publish_by_queue(released)
+    dispatched = 0
+    while True:
+        with transaction.atomic():
+            log_ids = list(
+                Log.objects.select_for_update(skip_locked=True)
+                .filter(status='retrying', next_attempt_at__lte=timezone.now())
+                .order_by('next_attempt_at').values_list('id', flat=True)[:settings.RETRY_DISPATCH_BATCH_SIZE]
+            )
+            Log.objects.filter(id__in=log_ids).update(status='pending', next_attempt_at=None)
+        if not log_ids:
+            break
+        queued, failed = _publish_by_queue(log_ids)
+        dispatched += len(queued)
+        if failed:
+            # Broker is down; the failed ids are 'retrying' again and wait for the next run
+            break
+    if dispatched:
+        logger.info(f"Dispatched {dispatched} due retries")
+    return dispatched
+
+def _purge_orphan_payloads(payload_ids):
+    # Payloads are shared by digest, so they only go once no log points at them any more.
+    # An ingest reusing one holds its row locked (store_payloads) until its logs commit, so the
+    # DELETE waits and then fails the foreign key check; that payload stays and goes with the
+    # new log instead, and the rest of the chunk is retried one by one.
     try:
-        response = requests.request(
-            method=destination.http_method,
-            url=destination.url,
-            headers=destination.headers,
-            json=log.received_data
+        return Payload.objects.filter(id__in=payload_ids, logs__isnull=True).delete()[0]
+    except (ProtectedError, IntegrityError) as e:
+        if len(payload_ids) > 1:
+            return sum(_purge_orphan_payloads({payload_id}) for payload_id in payload_ids)
+        logger.warning(f"Skipped payload {next(iter(payload_ids))} reused during purge: {str(e)}")
+        return 0
+
+def _purge_logs(queryset):
+    # Short DELETEs by primary key keep lock time and WAL bursts bounded however large the backlog
+    logs = payloads = 0
+    while True:
+        rows = list(queryset.values_list('id', 'payload_id')[:settings.LOG_PURGE_BATCH_SIZE])
+        if not rows:
+            return logs, payloads
+        logs += Log.objects.filter(id__in=[log_id for log_id, _ in rows]).delete()[0]
+        payloads += _purge_orphan_payloads({payload_id for _, payload_id in rows if payload_id})
+
+@shared_task
+def purge_expired_logs():
+    """
+    Periodic (celery beat) retention: deletes each account's finished logs received before
+    its log_retention_days, along with payloads no remaining log references.
+    """
+    now = timezone.now()
+    purged_logs = purged_payloads = 0
+    for account_id, retention_days in Account.objects.values_list('id', 'log_retention_days'):
+        cutoff = now - timedelta(days=retention_days or settings.LOG_RETENTION_DAYS_DEFAULT)
+        logs, payloads = _purge_logs(
+            Log.objects.filter(account_id=account_id, received_timestamp__lt=cutoff)
+            .exclude(status__in=['pending', 'processing', 'retrying'])
         )
-        log.status = 'success' if response.status_code in range(200, 300) else 'failed'
-        logger.info(f"Task for log {log_id} completed: Status={log.status}, URL={destination.url}, HTTP Code={response.status_code}")
-    except Exception as e:
-        log.status = 'failed'
-        log.received_data["error_message"] = str(e)
-        logger.error(f"Task for log {log_id} failed: {str(e)}")
-    log.processed_timestamp = timezone.now()
-    log.save()
\ No newline at end of file
+        if logs:
+            bump('logs', account_id)
+            logger.info(f"Purged {logs} logs and {payloads} payloads of account {account_id} received before {cutoff}")
+        purged_logs += logs
+        purged_payloads += payloads
+    return {'logs': purged_logs, 'payloads': purged_payloads}
+
+@shared_task
+def report_http_pool_stats():
+    # Pool statistics of every delivering process, as each last published them
+    stats = http_client.all_pool_stats()
+    for process, pools in stats.items():
+        logger.info(f"HTTP pool stats for {process}: {pools}")
+    return stats
@@ -1,3 +1,809 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import os
+import socket
+from datetime import timedelta
+from unittest import mock, skipUnless
+import fakeredis
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DataError, IntegrityError, OperationalError, connection
+from django.db.models import QuerySet
+from django.http import QueryDict
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+from rest_framework.request import Request
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory
+from accounts.models import Account, AccountMember
+from accounts import token_cache
+from users.models import CustomUser, Role
+from data_manager import redis_client
+from data_manager.cache_namespace import bump, get_generation
+from . import circuit_breaker, delivery, http_client, idempotency, ingest_stream, rate_limits, routing, tasks, token_bucket
+from .delivery_engine import DeliveryEngine
+from .export import LOG_EXPORT_FIELDS
+from .queues import delivery_queue
+from .filters import filter_logs
+from .models import Destination, Log, Payload
+from .pagination import KeysetPagination
+from .parsers import ORJSONParser, NDJSONParser
+from .renderers import ORJSONRenderer, NDJSONRenderer, CSVRenderer
 
-# Create your tests here.
+@skipUnless(connection.vendor == 'sqlite', "Asserts on SQLite's EXPLAIN QUERY PLAN output")
+class LogQueryPlanTests(TestCase):
+    """
+    Every LogListView filter combination must be answered by an index range scan in the
+    requested order, i.e. without a full table scan or a temporary sort.
+    """
+    ORDERED_COMBINATIONS = [
+        '',
+        'ordering=received_timestamp',
+        'status=success',
+        'status=failed',
+        'destination_id=1',
+        'received_timestamp__gte=2025-01-01T00:00:00Z&received_timestamp__lte=2025-02-01T00:00:00Z',
+        'status=failed&destination_id=1',
+        'status=pending&received_timestamp__gte=2025-01-01T00:00:00Z',
+        'destination_id=1&received_timestamp__gte=2025-01-01T00:00:00Z',
+        'status=retrying&destination_id=1&received_timestamp__lte=2025-02-01T00:00:00Z',
+    ]
+    # Event id lookups return a handful of rows, so sorting them afterwards is fine
+    SEARCH_COMBINATIONS = [
+        'event_id=evt1&event_id_match=exact',
+        'event_id=evt1&event_id_match=prefix',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = Account.objects.create(name='plans')
+        destination = Destination.objects.create(account=cls.account, url='https://example.com/hook', http_method='POST', headers={'Content-Type': 'application/json'})
+        # Mostly delivered logs, like production; the planner needs the statistics to pick partial indexes
+        Log.objects.bulk_create([
+            Log(event_id=f"evt{i}-{destination.id}", account=cls.account, destination=destination,
+                received_timestamp=timezone.now(), status='success' if i % 50 else ['failed', 'pending', 'retrying'][i % 3])
+            for i in range(2000)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def filtered(self, query_string):
+        return filter_logs(Log.objects.filter(account_id=self.account.id), QueryDict(query_string))
+
+    def assertIndexed(self, plan):
+        self.assertIn('SEARCH destinations_log USING INDEX', plan)
+        self.assertNotIn('SCAN destinations_log', plan)
+
+    def test_filter_combinations_use_an_index_in_order(self):
+        for query_string in self.ORDERED_COMBINATIONS:
+            with self.subTest(query_string=query_string):
+                plan = self.filtered(query_string)[:101].explain()
+                self.assertIndexed(plan)
+                self.assertNotIn('USE TEMP B-TREE', plan)
+
+    def test_cursor_pages_use_an_index_in_order(self):
+        for query_string in self.ORDERED_COMBINATIONS:
+            with self.subTest(query_string=query_string):
+                queryset = KeysetPagination().after(self.filtered(query_string), timezone.now(), 1000)
+                plan = queryset[:101].explain()
+                self.assertIndexed(plan)
+                self.assertNotIn('USE TEMP B-TREE', plan)
+
+    def test_event_id_search_uses_an_index(self):
+        for query_string in self.SEARCH_COMBINATIONS:
+            with self.subTest(query_string=query_string):
+                self.assertIndexed(self.filtered(query_string)[:101].explain())
+
+class WideIntegerJSONTests(SimpleTestCase):
+    """
+    orjson only handles 64-bit integers; wider ones must survive parsing and rendering exactly.
+    """
+    WIDE = 123456789012345678901234567890
+
+    def test_parsers_keep_wide_integers_exact(self):
+        body = b'{"id": 123456789012345678901234567890, "low": -9223372036854775809, "n": 1.5}'
+        data = ORJSONParser().parse(io.BytesIO(body))
+        self.assertEqual(data, {'id': self.WIDE, 'low': -9223372036854775809, 'n': 1.5})
+        self.assertIsInstance(data['low'], int)
+        items = NDJSONParser().parse(io.BytesIO(b'{"id": 1}\n{"id": 123456789012345678901234567890}\n'))
+        self.assertEqual(items, [{'id': 1}, {'id': self.WIDE}])
+
+    def test_parsers_still_reject_invalid_json(self):
+        for body in (b'{"id": 123456789012345678901234567890', b'{"n": NaN, "id": 1234567890123456789012}'):
+            with self.assertRaises(ParseError):
+                ORJSONParser().parse(io.BytesIO(body))
+
+    def test_renderers_fall_back_for_wide_integers(self):
+        row = {'id': 7, 'payload': {'value': self.WIDE}}
+        self.assertEqual(ORJSONRenderer().render(row), b'{"id":7,"payload":{"value":123456789012345678901234567890}}')
+        self.assertEqual(NDJSONRenderer().render([row]), b'{"id":7,"payload":{"value":123456789012345678901234567890}}\n')
+        self.assertEqual(CSVRenderer().render([row]), b'id,payload\r\n7,"{""value"":123456789012345678901234567890}"\r\n')
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+class FakeRedisMixin:
+    """
+    Points get_redis() at a fresh fakeredis server. Redis TIME and key expiry both follow
+    time.time(), so self.clock moves the Redis clock without sleeping.
+    """
+    def setUp(self):
+        super().setUp()
+        self.redis = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+        self.clock = FakeClock()
+        for patcher in (mock.patch.dict(redis_client._clients, {settings.REDIS_URL: self.redis}), mock.patch('time.time', self.clock)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+@override_settings(CIRCUIT_FAILURE_THRESHOLD=3, CIRCUIT_FAILURE_WINDOW=60, CIRCUIT_OPEN_SECONDS=30, CIRCUIT_PROBE_INTERVAL=5)
+class CircuitBreakerTests(FakeRedisMixin, SimpleTestCase):
+    def test_opens_after_threshold_failures(self):
+        for _ in range(2):
+            circuit_breaker.record(1, False)
+        self.assertEqual(circuit_breaker.get_state(1)['state'], 'closed')
+        self.assertEqual(circuit_breaker.allow(1), (True, 0))
+        circuit_breaker.record(1, False)
+        self.assertEqual(circuit_breaker.get_state(1)['state'], 'open')
+        self.clock.advance(10)
+        self.assertEqual(circuit_breaker.allow(1), (False, 20))
+
+    def test_failures_outside_the_window_start_a_new_count(self):
+        for _ in range(2):
+            circuit_breaker.record(1, False)
+        self.clock.advance(61)
+        circuit_breaker.record(1, False)
+        self.assertEqual(circuit_breaker.get_state(1), {'destination': 1, 'state': 'closed', 'failures': 1, 'opened_at_ms': None})
+
+    def test_half_open_allows_one_probe_per_interval_and_closes_on_success(self):
+        for _ in range(3):
+            circuit_breaker.record(1, False)
+        self.clock.advance(30)
+        self.assertEqual(circuit_breaker.allow(1), (True, 0))
+        self.assertEqual(circuit_breaker.get_state(1)['state'], 'half_open')
+        self.clock.advance(2)
+        self.assertEqual(circuit_breaker.allow(1), (False, 3))
+        self.clock.advance(3.01)
+        self.assertEqual(circuit_breaker.allow(1), (True, 0))
+        circuit_breaker.record(1, True)
+        self.assertEqual(circuit_breaker.get_state(1), {'destination': 1, 'state': 'closed', 'failures': 0, 'opened_at_ms': None})
+        self.assertEqual(circuit_breaker.allow(1), (True, 0))
+
+    def test_failed_probe_reopens(self):
+        for _ in range(3):
+            circuit_breaker.record(1, False)
+        self.clock.advance(30)
+        self.assertEqual(circuit_breaker.allow(1), (True, 0))
+        circuit_breaker.record(1, False)
+        self.assertEqual(circuit_breaker.get_state(1)['state'], 'open')
+        self.assertEqual(circuit_breaker.allow(1), (False, 30))
+
+class TokenBucketTests(FakeRedisMixin, SimpleTestCase):
+    def test_burst_then_retry_after_then_refill(self):
+        self.assertEqual(token_bucket.consume('bucket', 2, 2), (True, 0))
+        self.assertEqual(token_bucket.consume('bucket', 2, 2), (True, 0))
+        self.assertEqual(token_bucket.consume('bucket', 2, 2), (False, 0.5))
+        self.clock.advance(0.25)
+        self.assertEqual(token_bucket.consume('bucket', 2, 2), (False, 0.25))
+        self.clock.advance(0.25)
+        self.assertEqual(token_bucket.consume('bucket', 2, 2), (True, 0))
+
+    def test_refill_is_capped_at_burst(self):
+        self.assertEqual(token_bucket.consume('bucket', 1, 2, cost=2), (True, 0))
+        self.clock.advance(3600)
+        self.assertEqual(token_bucket.consume('bucket', 1, 2, cost=2), (True, 0))
+        self.assertEqual(token_bucket.consume('bucket', 1, 2), (False, 1))
+
+class RateLimitTests(FakeRedisMixin, SimpleTestCase):
+    def destination(self, **limits):
+        return Destination(id=1, connect_timeout=1, read_timeout=4, **limits)
+
+    def test_concurrency_slots_are_released_or_expire(self):
+        destination = self.destination(max_concurrency=1)
+        self.assertEqual(rate_limits.acquire(destination, 'a'), (True, 0))
+        self.assertEqual(rate_limits.acquire(destination, 'b'), (False, rate_limits.CONCURRENCY_RETRY_AFTER))
+        rate_limits.release(destination, 'a')
+        self.assertEqual(rate_limits.acquire(destination, 'b'), (True, 0))
+        # A worker that dies holding 'b' loses it once the lease (timeouts + 5s) runs out
+        self.clock.advance(9.9)
+        self.assertEqual(rate_limits.acquire(destination, 'c'), (False, rate_limits.CONCURRENCY_RETRY_AFTER))
+        self.clock.advance(0.2)
+        self.assertEqual(rate_limits.acquire(destination, 'c'), (True, 0))
+
+    def test_rate_limit_gives_the_concurrency_slot_back(self):
+        destination = self.destination(max_concurrency=2, max_rps=1)
+        self.assertEqual(rate_limits.acquire(destination, 'a'), (True, 0))
+        self.assertEqual(rate_limits.acquire(destination, 'b'), (False, 1))
+        self.assertEqual(self.redis.zrange('dest_concurrency:1', 0, -1), [b'a'])
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DeliveryTestCase(FakeRedisMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = Account.objects.create(name='deliveries', priority='high')
+        cls.payload = Payload.objects.create(digest='deliveries', data={'n': 1})
+        cls.queue = delivery_queue(cls.account.id, 'high')
+
+    def create_destination(self, **fields):
+        return Destination.objects.create(account=self.account, url='https://example.com/hook', http_method='POST', headers={}, **fields)
+
+    def create_logs(self, destination, count):
+        start = Log.objects.count()
+        return Log.objects.bulk_create([
+            Log(event_id=f"evt{start + i}", account=self.account, destination=destination, payload=self.payload,
+                received_timestamp=timezone.now(), status='pending')
+            for i in range(count)
+        ])
+
+class ParkedDeliveryTests(DeliveryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.destination = self.create_destination(max_concurrency=1)
+        # Another worker holds the only concurrency slot
+        rate_limits.acquire(self.destination, 'elsewhere')
+
+    def test_parked_logs_are_requeued_on_their_account_queue_when_due(self):
+        log, = self.create_logs(self.destination, 1)
+        with mock.patch.object(tasks.dispatch_parked_logs, 'apply_async') as apply_async:
+            tasks.send_to_destination_batch([log.id])
+        log.refresh_from_db()
+        self.assertEqual((log.status, log.attempts), ('retrying', 0))
+        apply_async.assert_called_once()
+        self.assertEqual(apply_async.call_args.args, (([log.id], self.account.id, self.queue),))
+        self.assertEqual(apply_async.call_args.kwargs['queue'], self.queue)
+        self.assertTrue(rate_limits.CONCURRENCY_RETRY_AFTER - 0.1 < apply_async.call_args.kwargs['countdown'] <= rate_limits.CONCURRENCY_RETRY_AFTER + 1)
+
+        with mock.patch('destinations.fanout.publish_deliveries') as publish:
+            # A message delivered early leaves the log to a later dispatch
+            self.assertEqual(tasks.dispatch_parked_logs([log.id], self.account.id, self.queue), 0)
+            Log.objects.filter(id=log.id).update(next_attempt_at=timezone.now())
+            self.assertEqual(tasks.dispatch_parked_logs([log.id], self.account.id, self.queue), 1)
+            # A duplicate finds it already dispatched
+            self.assertEqual(tasks.dispatch_parked_logs([log.id], self.account.id, self.queue), 0)
+        publish.assert_called_once_with([log.id], self.queue)
+        log.refresh_from_db()
+        self.assertEqual((log.status, log.next_attempt_at), ('pending', None))
+
+    def test_engine_requeues_parked_logs_once_written_and_due(self):
+        logs = self.create_logs(self.destination, 1)
+        engine = DeliveryEngine()
+        async_to_sync(engine._deliver)(None, logs)
+        async_to_sync(engine._flush)()
+        parked_at = Log.objects.get(id=logs[0].id).next_attempt_at
+        self.assertEqual(engine._parked, [(parked_at, logs[0].id)])
+        self.assertLessEqual(engine._idle_interval(), rate_limits.CONCURRENCY_RETRY_AFTER + 1)
+
+        async_to_sync(engine._requeue_due)()
+        self.assertEqual(Log.objects.get(id=logs[0].id).status, 'retrying')
+        with mock.patch('django.utils.timezone.now', return_value=parked_at + timedelta(milliseconds=1)):
+            self.assertEqual(engine._idle_interval(), 0)
+            async_to_sync(engine._requeue_due)()
+        self.assertEqual(engine._parked, [])
+        self.assertEqual(Log.objects.get(id=logs[0].id).status, 'pending')
+
+class SendBatchClaimTests(DeliveryTestCase):
+    def test_logs_are_claimed_while_delivered_and_released_if_the_worker_dies(self):
+        destination = self.create_destination()
+        batching = self.create_destination(batch_max_size=10)
+        logs = self.create_logs(destination, 2) + self.create_logs(batching, 1)
+        log_ids = [log.id for log in logs]
+
+        def send(*args, **kwargs):
+            # Mid-delivery the logs are held by this worker
+            self.assertEqual(Log.objects.filter(destination=destination, status='processing').exclude(claimed_at=None).count(), 2)
+            raise SystemExit
+        with mock.patch('destinations.http_client.send', side_effect=send), \
+                mock.patch.object(tasks.flush_destination_batch, 'apply_async') as apply_async:
+            with self.assertRaises(SystemExit):
+                tasks.send_to_destination_batch(log_ids)
+        apply_async.assert_called_once()
+        # The batching destination's log is left pending for its flush
+        self.assertEqual(Log.objects.get(destination=batching).status, 'pending')
+
+        self.assertEqual(delivery.release_stale_claims(settings.DELIVERY_CLAIM_LEASE), [])
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(seconds=settings.DELIVERY_CLAIM_LEASE + 1)):
+            self.assertEqual(len(delivery.release_stale_claims(settings.DELIVERY_CLAIM_LEASE)), 2)
+
+        response = mock.Mock(status_code=200, content=b'')
+        with mock.patch('destinations.http_client.send', return_value=response):
+            tasks.send_to_destination_batch(log_ids)
+        self.assertEqual(
+            sorted(Log.objects.filter(destination=destination).values_list('status', 'claimed_at')),
+            [('success', None)] * 2
+        )
+
+class StaleClaimSweepTests(DeliveryTestCase):
+    def test_retry_dispatcher_releases_abandoned_claims_of_every_destination(self):
+        destination = self.create_destination()
+        batching = self.create_destination(batch_max_size=10)
+        claimed_at = timezone.now() - timedelta(seconds=settings.DELIVERY_CLAIM_LEASE + 1)
+        stale = self.create_logs(destination, 1) + self.create_logs(batching, 2)
+        fresh = self.create_logs(destination, 1)
+        Log.objects.filter(id__in=[log.id for log in stale]).update(status='processing', claimed_at=claimed_at)
+        Log.objects.filter(id__in=[log.id for log in fresh]).update(status='processing', claimed_at=timezone.now())
+
+        with mock.patch('destinations.fanout.publish_deliveries', side_effect=lambda log_ids, queue: (log_ids, [])) as publish:
+            self.assertEqual(tasks.dispatch_due_retries(), 0)
+        publish.assert_called_once()
+        log_ids, queue = publish.call_args.args
+        self.assertEqual(sorted(log_ids), sorted(log.id for log in stale))
+        self.assertEqual(queue, self.queue)
+        self.assertEqual(Log.objects.get(id=fresh[0].id).status, 'processing')
+
+        # The published task delivers the single log and hands the batching ones to a flush
+        response = mock.Mock(status_code=200, content=b'')
+        with mock.patch('destinations.http_client.send', return_value=response), \
+                mock.patch.object(tasks.flush_destination_batch, 'apply_async') as apply_async:
+            tasks.send_to_destination_batch(log_ids)
+        self.assertEqual(apply_async.call_args.args, ((batching.id,),))
+        self.assertEqual(Log.objects.get(id=stale[0].id).status, 'success')
+        self.assertEqual(list(Log.objects.filter(destination=batching).values_list('status', flat=True)), ['pending'] * 2)
+
+class RetryPolicyTests(DeliveryTestCase):
+    def deliver(self, log, status_code=None, error=None):
+        response = mock.Mock(status_code=status_code, content=b'')
+        with mock.patch('destinations.http_client.send', return_value=response, side_effect=error):
+            tasks.send_to_destination_batch([log.id])
+        log.refresh_from_db()
+        return log
+
+    def test_retryable_failures_back_off_until_the_log_is_dead(self):
+        log, = self.create_logs(self.create_destination(max_attempts=3), 1)
+        for attempt, status_code, error in ((1, 503, None), (2, None, ConnectionError('refused'))):
+            log = self.deliver(log, status_code, error)
+            self.assertEqual((log.status, log.attempts), ('retrying', attempt))
+            # Equal jitter: between half and all of RETRY_BACKOFF_BASE * 2 ** (attempt - 1)
+            delay = (log.next_attempt_at - log.processed_timestamp).total_seconds()
+            full = settings.RETRY_BACKOFF_BASE * 2 ** (attempt - 1)
+            self.assertTrue(full / 2 <= delay <= full, delay)
+            # What dispatch_due_retries does once it is due
+            Log.objects.filter(id=log.id).update(status='pending', next_attempt_at=None)
+        log = self.deliver(log, 503)
+        self.assertEqual((log.status, log.attempts, log.next_attempt_at), ('dead', 3, None))
+
+    def test_non_retryable_client_errors_fail_at_once(self):
+        destination = self.create_destination()
+        failed, throttled = self.create_logs(destination, 2)
+        failed = self.deliver(failed, 400)
+        self.assertEqual((failed.status, failed.attempts, failed.response_status, failed.next_attempt_at), ('failed', 1, 400, None))
+        # Some 4xx are about timing rather than the request itself
+        self.assertEqual(self.deliver(throttled, 429).status, 'retrying')
+
+    @override_settings(RETRY_BACKOFF_MAX=10)
+    def test_backoff_is_capped(self):
+        for _ in range(20):
+            self.assertTrue(5 <= delivery.retry_delay(30) <= 10)
+
+class EngineCapacityTests(DeliveryTestCase):
+    def test_a_saturated_destination_neither_holds_claims_nor_crowds_out_others(self):
+        slow, other = self.create_destination(), self.create_destination()
+        slow_logs = self.create_logs(slow, 5)
+        other_logs = self.create_logs(other, 2)
+        engine = DeliveryEngine(max_in_flight=3, per_destination=2)
+
+        async def scenario():
+            hold = asyncio.Event()
+
+            async def deliver(client, logs):
+                await hold.wait()
+
+            in_flight = set()
+            with mock.patch.object(engine, '_deliver', deliver):
+                # Claims three of the slow destination's logs, starts two and hands the third back
+                self.assertEqual(await engine._claim_and_start(None, in_flight), 2)
+                # The slow destination is skipped, so the remaining slot goes to the other one
+                self.assertEqual(await engine._claim_and_start(None, in_flight), 1)
+                self.assertEqual(len(in_flight), 3)
+                hold.set()
+                await asyncio.gather(*in_flight)
+            self.assertEqual(engine._active, {})
+
+        async_to_sync(scenario)()
+        statuses = dict(Log.objects.values_list('id', 'status'))
+        self.assertEqual([statuses[log.id] for log in slow_logs], ['processing'] * 2 + ['pending'] * 3)
+        self.assertEqual([statuses[log.id] for log in other_logs], ['processing', 'pending'])
+        self.assertFalse(Log.objects.filter(status='pending').exclude(claimed_at=None).exists())
+
+class BatchFlushTests(DeliveryTestCase):
+    def flush(self, status_code):
+        destination = self.create_destination(batch_max_size=2)
+        self.create_logs(destination, 5)
+        response = mock.Mock(status_code=status_code, content=b'')
+        with mock.patch('destinations.http_client.send', return_value=response) as send, \
+                mock.patch.object(tasks.flush_destination_batch, 'apply_async') as apply_async:
+            tasks.flush_destination_batch(destination.id)
+        statuses = sorted(Log.objects.filter(destination=destination).values_list('status', flat=True))
+        return destination, send.call_count, apply_async, statuses
+
+    def test_rejected_chunks_do_not_stop_the_drain(self):
+        destination, requests, apply_async, statuses = self.flush(400)
+        self.assertEqual(requests, 3)
+        self.assertEqual(statuses, ['failed'] * 5)
+        apply_async.assert_not_called()
+
+    def test_pending_logs_get_another_flush_when_a_chunk_is_retried(self):
+        destination, requests, apply_async, statuses = self.flush(503)
+        self.assertEqual(requests, 1)
+        self.assertEqual(statuses, ['pending'] * 3 + ['retrying'] * 2)
+        apply_async.assert_called_once_with((destination.id,), countdown=destination.batch_linger_ms / 1000, queue=self.queue)
+
+    def test_a_full_batch_is_flushed_without_waiting_for_the_linger_window(self):
+        destination = self.create_destination(batch_max_size=2)
+        self.create_logs(destination, 1)
+        with mock.patch.object(tasks.flush_destination_batch, 'apply_async') as apply_async:
+            tasks.schedule_batch_flush(destination, self.queue)
+            self.create_logs(destination, 1)
+            tasks.schedule_batch_flush(destination, self.queue)
+            tasks.schedule_batch_flush(destination, self.queue)
+        self.assertEqual(apply_async.call_args_list, [
+            mock.call((destination.id,), countdown=destination.batch_linger_ms / 1000, queue=self.queue),
+            mock.call((destination.id,), countdown=0, queue=self.queue),
+        ])
+
+class LogRetentionTests(DeliveryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.destination = self.create_destination()
+        self.short = Account.objects.create(name='short retention', log_retention_days=2)
+        self.short_destination = Destination.objects.create(account=self.short, url='https://example.com/hook', http_method='POST', headers={})
+
+    def log(self, days_ago, status='success', destination=None, payload=None):
+        destination = destination or self.destination
+        return Log.objects.create(
+            event_id=f"retention{Log.objects.count()}", account=destination.account, destination=destination,
+            payload=payload or self.payload, status=status, received_timestamp=timezone.now() - timedelta(days=days_ago)
+        )
+
+    def remaining(self, logs):
+        return set(Log.objects.filter(id__in=[log.id for log in logs]).values_list('id', flat=True))
+
+    def test_only_finished_logs_past_the_account_retention_are_purged(self):
+        expired = settings.LOG_RETENTION_DAYS_DEFAULT + 1
+        purged = [self.log(expired, status) for status in ('success', 'failed', 'dead')]
+        # Open logs are still owed a delivery, whatever their age
+        kept = [self.log(expired, status) for status in ('pending', 'processing', 'retrying')]
+        # The default retention keeps this one; the account with two days does not
+        kept.append(self.log(3))
+        purged.append(self.log(3, destination=self.short_destination))
+        kept.append(self.log(1, destination=self.short_destination))
+
+        self.assertEqual(tasks.purge_expired_logs()['logs'], len(purged))
+        self.assertEqual(self.remaining(purged + kept), {log.id for log in kept})
+
+    @override_settings(LOG_PURGE_BATCH_SIZE=2)
+    def test_purge_deletes_in_bounded_batches(self):
+        logs = [self.log(3, destination=self.short_destination) for _ in range(5)]
+        with mock.patch.object(tasks, '_purge_orphan_payloads', wraps=tasks._purge_orphan_payloads) as purge_payloads:
+            self.assertEqual(tasks.purge_expired_logs()['logs'], 5)
+        self.assertEqual(purge_payloads.call_count, 3)
+        self.assertEqual(self.remaining(logs), set())
+
+    def test_payloads_go_once_no_log_references_them(self):
+        orphaned = Payload.objects.create(digest='orphaned', data={'n': 2})
+        shared = Payload.objects.create(digest='shared', data={'n': 3})
+        self.log(3, destination=self.short_destination, payload=orphaned)
+        self.log(3, destination=self.short_destination, payload=shared)
+        self.log(1, destination=self.short_destination, payload=shared)
+
+        self.assertEqual(tasks.purge_expired_logs(), {'logs': 2, 'payloads': 1})
+        self.assertEqual(set(Payload.objects.values_list('digest', flat=True)), {'deliveries', 'shared'})
+
+    def test_a_payload_reused_during_the_purge_does_not_keep_the_others(self):
+        reused = Payload.objects.create(digest='reused', data={'n': 4})
+        orphaned = Payload.objects.create(digest='orphaned', data={'n': 5})
+        self.log(3, destination=self.short_destination, payload=reused)
+        self.log(3, destination=self.short_destination, payload=orphaned)
+        delete = QuerySet.delete
+
+        def racing_delete(queryset):
+            # An ingest committing a log that reuses the payload makes its DELETE fail the foreign key check
+            if queryset.model is Payload and queryset.filter(id=reused.id).exists():
+                raise IntegrityError('FOREIGN KEY constraint failed')
+            return delete(queryset)
+        with mock.patch.object(QuerySet, 'delete', autospec=True, side_effect=racing_delete):
+            self.assertEqual(tasks.purge_expired_logs(), {'logs': 2, 'payloads': 1})
+        self.assertEqual(set(Payload.objects.filter(id__in=[reused.id, orphaned.id]).values_list('digest', flat=True)), {'reused'})
+
+class NullableOrderingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = Account.objects.create(name='ordering')
+        destination = Destination.objects.create(account=cls.account, url='https://example.com/hook', http_method='POST', headers={})
+        durations = [30, None, 10, 20, None, 10, None]
+        cls.logs = Log.objects.bulk_create([
+            Log(event_id=f"evt{i}", account=cls.account, destination=destination, received_timestamp=timezone.now(),
+                status='success' if duration is not None else 'pending', duration_ms=duration)
+            for i, duration in enumerate(durations)
+        ])
+
+    def pages(self, query_string):
+        # Follows the cursor two rows at a time and returns the ids of every page
+        ids, cursor = [], None
+        while True:
+            params = f"{query_string}&page_size=2" + (f"&cursor={cursor}" if cursor else '')
+            request = Request(APIRequestFactory().get('/logs/', QueryDict(params)))
+            paginator = KeysetPagination()
+            ids.extend(log.id for log in paginator.paginate_queryset(filter_logs(Log.objects.filter(account_id=self.account.id), request.query_params), request))
+            if paginator.next_cursor is None:
+                return ids
+            cursor = paginator.next_cursor
+
+    def test_logs_without_a_value_are_listed_last(self):
+        pk = [log.id for log in self.logs]
+        self.assertEqual(self.pages('ordering=duration_ms'), [pk[2], pk[5], pk[3], pk[0], pk[1], pk[4], pk[6]])
+        self.assertEqual(self.pages('ordering=-duration_ms'), [pk[0], pk[3], pk[5], pk[2], pk[6], pk[4], pk[1]])
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ApiTestCase(FakeRedisMixin, TestCase):
+    """
+    An account member with an API token and one destination; deliveries are not published.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email='api@example.com', password='x')
+        cls.account = Account.objects.create(name='api')
+        AccountMember.objects.create(account=cls.account, user=cls.user, role=Role.objects.create(role_name='Admin'))
+        cls.token = Token.objects.create(user=cls.user)
+        cls.destination = Destination.objects.create(account=cls.account, url='https://example.com/hook', http_method='POST', headers={})
+
+    def setUp(self):
+        super().setUp()
+        # Ids are reused between tests, so nothing cached in-process may carry over
+        cache.clear()
+        token_cache._local_cache.clear()
+        routing._local_tables.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}", HTTP_CL_X_TOKEN=str(self.account.app_secret_token))
+        patcher = mock.patch('destinations.fanout.publish_deliveries', side_effect=lambda log_ids, queue=None: (list(log_ids), []))
+        self.publish = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def ingest(self, data, event_id=None):
+        headers = {'HTTP_CL_X_EVENT_ID': event_id} if event_id else {}
+        return self.client.post('/server/incoming_data/', data, format='json', **headers)
+
+class EventIdDedupTests(ApiTestCase):
+    def test_retry_is_answered_from_redis(self):
+        self.assertEqual(self.ingest({'n': 1}, 'evt').json(), {'message': 'Data Received'})
+        # Only DRF's token authentication reads the database
+        with self.assertNumQueries(1):
+            response = self.ingest({'n': 1}, 'evt')
+        self.assertEqual((response.status_code, response.json()), (200, {'message': 'Already accepted'}))
+        self.assertEqual(Log.objects.filter(event_id=f"evt-{self.destination.id}").count(), 1)
+
+    def test_retry_after_the_dedup_window_is_caught_by_the_unique_index(self):
+        self.ingest({'n': 1}, 'evt')
+        self.redis.flushall()
+        response = self.ingest({'n': 1}, 'evt')
+        self.assertEqual((response.status_code, response.json()), (200, {'message': 'Already accepted'}))
+        self.assertEqual(Log.objects.filter(account=self.account).count(), 1)
+        # The id is remembered again, so the next retry stays off the database
+        self.assertEqual(self.redis.get(f"event_seen:{self.account.id}:evt"), idempotency.ACCEPTED)
+
+    def test_retry_while_the_first_request_is_in_flight_gets_409_until_its_claim_lapses(self):
+        # A request that claimed the id and then died before storing anything
+        self.assertEqual(idempotency.claim_event(self.account.id, 'evt'), None)
+        self.assertEqual(self.ingest({'n': 1}, 'evt').status_code, 409)
+        self.clock.advance(settings.EVENT_ID_INFLIGHT_TIMEOUT + 1)
+        self.assertEqual(self.ingest({'n': 1}, 'evt').json(), {'message': 'Data Received'})
+        self.assertEqual(self.redis.ttl(f"event_seen:{self.account.id}:evt"), settings.EVENT_ID_DEDUP_TIMEOUT)
+
+    def test_failed_insert_releases_the_claim(self):
+        with mock.patch('destinations.fanout.store_payloads', side_effect=RuntimeError('db down')):
+            self.assertEqual(self.ingest({'n': 1}, 'evt').status_code, 500)
+        self.assertEqual(self.ingest({'n': 1}, 'evt').json(), {'message': 'Data Received'})
+
+    def test_over_long_event_id_is_rejected_before_claiming(self):
+        response = self.ingest({'n': 1}, 'e' * 65)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.redis.keys('event_seen:*'), [])
+
+class BatchIngestTests(ApiTestCase):
+    def test_each_item_gets_its_own_result(self):
+        idempotency.accept_events(self.account.id, ['seen'])
+        # Logged before the dedup window lapsed: only the unique index knows it
+        Log.objects.create(event_id=f"old-{self.destination.id}", account=self.account, destination=self.destination, status='success')
+        idempotency.claim_event(self.account.id, 'busy')
+        deferred_event_id = f"deferred-{self.destination.id}"
+
+        def publish(log_ids, queue=None):
+            deferred = set(Log.objects.filter(id__in=log_ids, event_id=deferred_event_id).values_list('id', flat=True))
+            return [log_id for log_id in log_ids if log_id not in deferred], list(deferred)
+        self.publish.side_effect = publish
+
+        response = self.client.post('/server/incoming_data/batch/', [
+            {'event_id': 'new', 'data': {'n': 0}},
+            {'event_id': 'seen', 'data': {'n': 1}},
+            {'event_id': 'deferred', 'data': {'n': 2}},
+            {'event_id': 'empty', 'data': {}},
+            'not an object',
+            {'event_id': 'new', 'data': {'n': 5}},
+            {'event_id': 'busy', 'data': {'n': 6}},
+            {'event_id': 'old', 'data': {'n': 7}},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['accepted'], body['duplicates'], body['rejected']), (2, 2, 4))
+        self.assertEqual(
+            [(result['index'], result['status']) for result in body['results']],
+            [(0, 'accepted'), (1, 'duplicate'), (2, 'deferred'), (3, 'rejected'), (4, 'rejected'),
+             (5, 'rejected'), (6, 'rejected'), (7, 'duplicate')]
+        )
+        self.assertEqual(body['results'][5]['errors'], {'event_id': ['Duplicate event_id in batch']})
+        self.assertIn('event_id', body['results'][6]['errors'])
+        self.assertEqual(
+            sorted(Log.objects.filter(account=self.account).values_list('event_id', flat=True)),
+            sorted(f"{event_id}-{self.destination.id}" for event_id in ('new', 'deferred', 'old'))
+        )
+        # Stored events are remembered, deferred ones included; the in-flight id is left to its owner
+        for event_id in ('new', 'deferred', 'old'):
+            self.assertEqual(self.redis.get(f"event_seen:{self.account.id}:{event_id}"), idempotency.ACCEPTED)
+        self.assertEqual(self.redis.get(f"event_seen:{self.account.id}:busy"), idempotency.IN_FLIGHT)
+
+    def test_ndjson_body_is_accepted(self):
+        body = b'{"event_id": "a", "data": {"n": 1}}\n{"data": {"n": 2}}\n'
+        response = self.client.post('/server/incoming_data/batch/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.json()['accepted'], 2)
+        self.assertEqual(Log.objects.filter(account=self.account).count(), 2)
+
+    def test_empty_or_oversized_batches_are_rejected_whole(self):
+        self.assertEqual(self.client.post('/server/incoming_data/batch/', [], format='json').status_code, 400)
+        with override_settings(DATA_HANDLER_BATCH_MAX_ITEMS=2):
+            items = [{'data': {'n': n}} for n in range(3)]
+            self.assertEqual(self.client.post('/server/incoming_data/batch/', items, format='json').status_code, 400)
+        self.assertFalse(Log.objects.exists())
+
+class ListCacheTests(ApiTestCase):
+    def log_statuses(self):
+        return [log['status'] for log in self.client.get(f"/accounts/{self.account.id}/logs/").json()['results']]
+
+    def test_log_pages_are_served_from_cache_until_a_write_bumps_the_generation(self):
+        self.ingest({'n': 1})
+        self.assertEqual(self.log_statuses(), ['pending'])
+        # A change made behind the cache's back is not seen...
+        Log.objects.update(status='failed')
+        self.assertEqual(self.log_statuses(), ['pending'])
+        # ...until ingest or delivery write-back bumps the account's generation
+        bump('logs', self.account.id)
+        self.assertEqual(self.log_statuses(), ['failed'])
+        self.ingest({'n': 2})
+        self.assertEqual(self.log_statuses(), ['pending', 'failed'])
+
+    def test_a_bump_only_invalidates_its_own_account(self):
+        self.assertEqual(self.log_statuses(), [])
+        other = Account.objects.create(name='other')
+        generation = get_generation('logs', self.account.id)
+        bump('logs', other.id)
+        self.assertEqual(get_generation('logs', self.account.id), generation)
+        bump('logs', self.account.id)
+        self.assertEqual(get_generation('logs', self.account.id), generation + 1)
+
+    def test_destination_changes_invalidate_cached_destination_pages(self):
+        url = f"/accounts/{self.account.id}/destinations/"
+        self.assertEqual(len(self.client.get(url).json()), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Destination.objects.create(account=self.account, url='https://example.com/other', http_method='POST', headers={})
+        self.assertEqual(len(self.client.get(url).json()), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.destination.delete()
+        self.assertEqual(len(self.client.get(url).json()), 1)
+
+class LogExportTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+
+        def log(event_id, minutes_ago, account=self.account, **fields):
+            return Log.objects.create(
+                event_id=event_id, account=account, destination=self.destination,
+                received_timestamp=now - timedelta(minutes=minutes_ago), **fields
+            )
+        payload = Payload.objects.create(digest='export', data={'n': 1, 'text': 'a, "quoted" value'})
+        log('ok-1', 3, payload=payload, status='success', response_status=200, duration_ms=10)
+        log('bad-1', 2, payload=payload, status='failed', response_status=400, duration_ms=30)
+        # Written before payloads were split out of Log
+        log('legacy-1', 1, received_data={'n': 2}, status='pending')
+        log('foreign-1', 0, account=Account.objects.create(name='foreign'), payload=payload, status='success')
+
+    def export(self, query=''):
+        response = self.client.get(f"/accounts/{self.account.id}/logs/export/{query}")
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def ndjson(self, query=''):
+        response, body = self.export(query)
+        return [json.loads(line) for line in body.splitlines()]
+
+    def test_ndjson_is_the_default_and_streams_the_account_logs(self):
+        response, body = self.export()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="logs-{self.account.id}.ndjson"')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['event_id'] for row in rows], ['legacy-1', 'bad-1', 'ok-1'])
+        self.assertEqual(list(rows[0]), LOG_EXPORT_FIELDS)
+        self.assertEqual([row['received_data']['n'] for row in rows], [2, 1, 1])
+
+    def test_list_filters_and_ordering_apply(self):
+        self.assertEqual([row['event_id'] for row in self.ndjson('?status=failed')], ['bad-1'])
+        self.assertEqual([row['event_id'] for row in self.ndjson('?response_status__gte=300')], ['bad-1'])
+        self.assertEqual([row['event_id'] for row in self.ndjson('?event_id=ok&event_id_match=prefix')], ['ok-1'])
+        # Logs without a duration yet come last
+        self.assertEqual([row['event_id'] for row in self.ndjson('?ordering=-duration_ms')], ['bad-1', 'ok-1', 'legacy-1'])
+
+    def test_csv_has_a_header_and_one_quoted_row_per_log(self):
+        response, body = self.export('?format=csv&ordering=received_timestamp')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="logs-{self.account.id}.csv"')
+        reader = csv.DictReader(io.StringIO(body))
+        rows = list(reader)
+        self.assertEqual(reader.fieldnames, LOG_EXPORT_FIELDS)
+        self.assertEqual([row['event_id'] for row in rows], ['ok-1', 'bad-1', 'legacy-1'])
+        self.assertEqual(json.loads(rows[0]['received_data']), {'n': 1, 'text': 'a, "quoted" value'})
+        self.assertEqual((rows[0]['response_status'], rows[2]['response_status'], rows[2]['duration_ms']), ('200', '', ''))
+
+    def test_unknown_format_is_not_found(self):
+        self.assertEqual(self.client.get(f"/accounts/{self.account.id}/logs/export/?format=xml").status_code, 404)
+
+class IngestStreamFlushTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        ingest_stream.ensure_group()
+        real_fan_out = ingest_stream.fan_out_events
+
+        def fan_out_events(account_id, destination_ids, events):
+            # Stands in for e.g. PostgreSQL refusing a value too long for its column
+            if any(event_id == 'bad' for event_id, _ in events):
+                raise DataError('value too long for type character varying(100)')
+            return real_fan_out(account_id, destination_ids, events)
+        patcher = mock.patch('destinations.ingest_stream.fan_out_events', side_effect=fan_out_events)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def pending(self):
+        return [entry['message_id'] for entry in self.redis.xpending_range(settings.INGEST_STREAM_KEY, settings.INGEST_STREAM_GROUP, '-', '+', 100)]
+
+    def test_a_failing_entry_does_not_hold_back_the_rest_and_is_dead_lettered(self):
+        ingest_stream.append_events(self.account.id, [('good1', {'n': 1}), ('bad', {'n': 2}), ('good2', {'n': 3})])
+        self.redis.xadd(settings.INGEST_STREAM_KEY, {'account_id': self.account.id, 'event_id': 'garbled', 'data': '{'})
+
+        self.assertEqual(ingest_stream.flush_entries(ingest_stream.read_entries('flusher', 10)), 2)
+        self.assertEqual(sorted(Log.objects.values_list('event_id', flat=True)), [f"good1-{self.destination.id}", f"good2-{self.destination.id}"])
+        self.assertEqual(len(self.pending()), 2)
+
+        # Retried on each reclaim until the delivery limit, then parked aside with the error
+        for _ in range(settings.INGEST_FLUSH_MAX_DELIVERIES - 1):
+            self.clock.advance(1)
+            ingest_stream.flush_entries(ingest_stream.claim_stalled_entries('flusher', 0, 10))
+        self.assertEqual(self.pending(), [])
+        dead = self.redis.xrange(settings.INGEST_DEAD_LETTER_KEY)
+        self.assertEqual(sorted(fields[b'event_id'] for _, fields in dead), [b'bad', b'garbled'])
+        self.assertIn(b'value too long', next(fields[b'error'] for _, fields in dead if fields[b'event_id'] == b'bad'))
+
+    def test_database_outage_leaves_the_chunk_pending_without_counting_against_it(self):
+        ingest_stream.append_events(self.account.id, [('good1', {'n': 1})])
+        with mock.patch('destinations.ingest_stream.fan_out_events', side_effect=OperationalError('connection refused')):
+            with self.assertRaises(OperationalError):
+                ingest_stream.flush_entries(ingest_stream.read_entries('flusher', 10))
+        self.assertEqual(len(self.pending()), 1)
+        self.assertEqual(self.redis.xlen(settings.INGEST_DEAD_LETTER_KEY), 0)
+
+class HttpPoolStatsTests(FakeRedisMixin, SimpleTestCase):
+    def test_each_delivering_process_publishes_its_pool_stats(self):
+        stats = [{'host': 'https://example.com:443', 'connections_opened': 1, 'requests': 3, 'idle_connections': 1}]
+        with mock.patch.object(http_client, 'get_session'), mock.patch.object(http_client, 'pool_stats', return_value=stats), \
+                mock.patch.object(http_client, '_stats_published_at', 0), mock.patch('time.monotonic', return_value=1000.0):
+            http_client.send('POST', 'https://example.com/hook', {}, {}, (1, 1))
+            self.redis.set('http_pool_stats:other-host:7', '[]')
+            self.assertEqual(tasks.report_http_pool_stats(), {f"{socket.gethostname()}:{os.getpid()}": stats, 'other-host:7': []})
@@ -0,0 +1,62 @@
+# destinations/throttling.py
+import uuid
+import logging
+import redis
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+from accounts.token_cache import resolve_account_id
+from .token_bucket import consume
+
+logger = logging.getLogger(__name__)
+
+_DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+def parse_rate(rate):
+    # '100/second' -> 100 tokens per second; same syntax as DEFAULT_THROTTLE_RATES
+    num, period = rate.split('/')
+    return int(num) / _DURATIONS[period[0]]
+
+def throttle_account(account_id, cost=1):
+    """
+    Consumes cost tokens from the account's ingest bucket. Returns (allowed, retry_after_seconds).
+    Fails open when Redis is unavailable.
+    """
+    scope = AccountTokenBucketThrottle.scope
+    rate = parse_rate(settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'][scope])
+    burst = settings.THROTTLE_BURSTS.get(scope, rate)
+    try:
+        # A batch larger than the burst drains the bucket instead of never fitting
+        return consume(f"throttle:{scope}:{account_id}", rate, burst, min(cost, burst))
+    except redis.RedisError as e:
+        logger.warning(f"Throttle unavailable, allowing request: {str(e)}")
+        return True, 0
+
+class AccountTokenBucketThrottle(BaseThrottle):
+    """
+    Token-bucket throttle keyed by the account behind CL-X-TOKEN, enforced atomically
+    in Redis so limits hold across all workers. Requests whose token does not resolve
+    to an account are limited per user instead. Batch requests cost one token per event.
+    """
+    scope = 'account'
+
+    def __init__(self):
+        self.retry_after = None
+
+    def get_bucket(self, request):
+        try:
+            account_id = resolve_account_id(request.user.id, str(uuid.UUID(request.headers.get('CL-X-TOKEN', ''))))
+        except ValueError:
+            account_id = None
+        if account_id:
+            return account_id
+        return f"user-{request.user.pk or self.get_ident(request)}"
+
+    def get_cost(self, request):
+        return len(request.data) if isinstance(request.data, list) and request.data else 1
+
+    def allow_request(self, request, view):
+        allowed, self.retry_after = throttle_account(self.get_bucket(request), self.get_cost(request))
+        return allowed
+
+    def wait(self):
+        return self.retry_after
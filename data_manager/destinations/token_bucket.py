@@ -0,0 +1,47 @@
+# destinations/token_bucket.py
+from data_manager.redis_client import get_redis
+
+# Refill, check and take in one atomic step. Uses the Redis clock so every worker
+# agrees on elapsed time. Returns {allowed, retry_after_ms}.
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil then
+    tokens = burst
+    ts = now
+end
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = math.ceil((cost - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 1000)
+return {allowed, retry_after}
+"""
+
+_scripts = {}
+
+def consume(key, rate, burst, cost=1):
+    """
+    Takes cost tokens from the bucket at key, refilled at rate tokens/second up to burst.
+    Returns (allowed, retry_after_seconds).
+    """
+    client = get_redis()
+    script = _scripts.get(id(client))
+    if script is None:
+        script = _scripts[id(client)] = client.register_script(TOKEN_BUCKET_LUA)
+    allowed, retry_after_ms = script(keys=[key], args=[rate, burst, cost])
+    return bool(allowed), retry_after_ms / 1000
@@ -1,9 +1,14 @@
 from django.urls import path
-from .views import DataHandlerView, DestinationListCreateView, DestinationUpdateDestroyView, LogListView
+from .async_views import async_data_handler
+from .views import DataHandlerView, BatchDataHandlerView, DestinationListCreateView, DestinationUpdateDestroyView, DestinationCircuitView, LogListView, LogExportView
 
 urlpatterns = [
     path('server/incoming_data/', DataHandlerView.as_view(), name='data-handler'),
+    path('server/incoming_data/batch/', BatchDataHandlerView.as_view(), name='data-handler-batch'),
+    path('server/incoming_data/async/', async_data_handler, name='data-handler-async'),
     path('accounts/<int:account_id>/destinations/', DestinationListCreateView.as_view(), name='destination-list-create'),
     path('destinations/<int:id>/', DestinationUpdateDestroyView.as_view(), name='destination-update-destroy'),
+    path('destinations/<int:id>/circuit/', DestinationCircuitView.as_view(), name='destination-circuit'),
     path('accounts/<int:account_id>/logs/', LogListView.as_view(), name='log-list'),
+    path('accounts/<int:account_id>/logs/export/', LogExportView.as_view(), name='log-export'),
 ]
\ No newline at end of file